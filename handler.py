@@ -2,15 +2,29 @@
 RunPod Serverless Handler - Phase 1: Hi3DGen Mesh Generation
 Generates 3D mesh from input image using Hi3DGen pipeline.
 Returns mesh as base64-encoded GLB (no textures, no UVs).
+
+Concurrent jobs are collected for a short window and run through the
+pipeline as one batch (see BATCH_MAX_SIZE / BATCH_MAX_WAIT_MS).
+
+Before serving, a synthetic image is run through the pipeline for each
+WARMUP_PRESETS entry so that first-request costs are paid at startup.
 """
 
 import os
 import base64
+import hashlib
 import io
+import uuid
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
 import runpod
-import trimesh
+import numpy as np
 import torch
 from PIL import Image
+from utils import glb
 
 # -----------------------------------------------------------------------------
 # Environment & cache locations (important for RunPod)
@@ -35,6 +49,7 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 # Note: If xformers is installed but incompatible, this import may fail
 # Solution: Rebuild Docker image without xformers in requirements.txt
 from hi3dgen.pipelines.hi3dgen import Hi3DGenPipeline
+from hi3dgen.representations.mesh import clean_mesh
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -54,41 +69,69 @@ try:
     yoso_path = f"{model_path}/yoso-normal-v1-8-1"
     
     hi3dgen_pipe = None
+
+    # A warm-state snapshot (see SNAPSHOT_DIR) restores everything in one pass
+    snapshot_dir = os.environ.get("SNAPSHOT_DIR", "").strip() or None
+    compile_cache_dir = os.environ.get("COMPILE_CACHE_DIR", os.path.join(os.environ["TORCH_HOME"], "compile_cache"))
+    restored_from_snapshot = False
+    if snapshot_dir is not None and os.path.exists(f"{snapshot_dir}/snapshot.json"):
+        try:
+            print(f"[Worker] Restoring snapshot from {snapshot_dir}")
+            hi3dgen_pipe = Hi3DGenPipeline.from_snapshot(snapshot_dir, device=DEVICE, compile_cache_dir=compile_cache_dir)
+            restored_from_snapshot = True
+        except Exception as e:
+            print(f"[Worker][WARN] Failed to restore snapshot ({e}), loading models instead")
+            hi3dgen_pipe = None
     
-    # Try yoso first (newer), then trellis as fallback
-    if os.path.exists(f"{yoso_path}/pipeline.json"):
-        print(f"[Worker] Found yoso model at {yoso_path}")
-        hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
-            yoso_path,
-            local_files_only=True
-        )
-    elif os.path.exists(f"{trellis_path}/pipeline.json"):
-        print(f"[Worker] Found trellis model at {trellis_path}")
-        hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
-            trellis_path,
-            local_files_only=True
-        )
-    elif os.path.exists(f"{model_path}/pipeline.json"):
-        # Fallback: models at root level
-        print(f"[Worker] Found model at {model_path}")
-        hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
-            model_path,
-            local_files_only=True
-        )
-    else:
-        print(f"[Worker][ERROR] No local models found at {model_path}")
-        print(f"[Worker][ERROR] Expected one of:")
-        print(f"[Worker][ERROR]   - {yoso_path}/pipeline.json")
-        print(f"[Worker][ERROR]   - {trellis_path}/pipeline.json")
-        print(f"[Worker][ERROR]   - {model_path}/pipeline.json")
-        print(f"[Worker][ERROR] HuggingFace download disabled - models must be baked into image")
-        raise FileNotFoundError(f"No Hi3DGen models found at {model_path}")
+    if hi3dgen_pipe is None:
+        # Try yoso first (newer), then trellis as fallback
+        if os.path.exists(f"{yoso_path}/pipeline.json"):
+            print(f"[Worker] Found yoso model at {yoso_path}")
+            hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
+                yoso_path,
+                device=DEVICE
+            )
+        elif os.path.exists(f"{trellis_path}/pipeline.json"):
+            print(f"[Worker] Found trellis model at {trellis_path}")
+            hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
+                trellis_path,
+                device=DEVICE
+            )
+        elif os.path.exists(f"{model_path}/pipeline.json"):
+            # Fallback: models at root level
+            print(f"[Worker] Found model at {model_path}")
+            hi3dgen_pipe = Hi3DGenPipeline.from_pretrained(
+                model_path,
+                device=DEVICE
+            )
+        else:
+            print(f"[Worker][ERROR] No local models found at {model_path}")
+            print(f"[Worker][ERROR] Expected one of:")
+            print(f"[Worker][ERROR]   - {yoso_path}/pipeline.json")
+            print(f"[Worker][ERROR]   - {trellis_path}/pipeline.json")
+            print(f"[Worker][ERROR]   - {model_path}/pipeline.json")
+            print(f"[Worker][ERROR] HuggingFace download disabled - models must be baked into image")
+            raise FileNotFoundError(f"No Hi3DGen models found at {model_path}")
     
     if hi3dgen_pipe is None:
         raise RuntimeError("Failed to load Hi3DGen pipeline - pipeline is None")
     
     # Move to device (pipeline handles eval mode internally)
     hi3dgen_pipe.to(DEVICE)
+
+    # Opt-in graph capture of the sparse structure flow (captured on the first job);
+    # a restored snapshot already carries the compile mode it was taken with
+    compile_mode = os.environ.get("COMPILE_MODE", "").strip() or None
+    if compile_mode is not None and compile_mode != hi3dgen_pipe.compile_mode:
+        hi3dgen_pipe.set_compile_mode(compile_mode, cache_dir=compile_cache_dir)
+    print(f"[Worker] Sparse structure flow compile mode: {hi3dgen_pipe.compile_mode}")
+
+    # DINOv2 embeddings of recently seen images are reused (seed sweeps, retries)
+    from hi3dgen.pipelines.cond_cache import ConditioningCache
+    hi3dgen_pipe.cond_cache = ConditioningCache(
+        device_budget_bytes=int(os.environ.get("COND_CACHE_GPU_MB", "512")) << 20,
+        cpu_budget_bytes=int(os.environ.get("COND_CACHE_CPU_MB", "2048")) << 20,
+    )
     
     print(f"[Worker] Hi3DGen loaded successfully on {DEVICE}")
 except Exception as e:
@@ -97,15 +140,358 @@ except Exception as e:
     traceback.print_exc()
     hi3dgen_pipe = None
 
+# -----------------------------------------------------------------------------
+# Warmup (before the worker accepts jobs)
+# -----------------------------------------------------------------------------
+
+# Comma-separated presets to run a synthetic image through before serving, each
+# "<image size>" or "<image size>:<ss steps>:<slat steps>" (e.g. "512,1024:12:12").
+# Empty disables warmup.
+WARMUP_PRESETS = os.environ.get("WARMUP_PRESETS", "512").strip()
+# Also warm the BiRefNet background removal (jobs currently skip it)
+WARMUP_PREPROCESS = os.environ.get("WARMUP_PREPROCESS", "0") == "1"
+
+# Reported in the debug block of every response
+WORKER_STATE = {
+    "ready": False,
+    "started_at": time.time(),
+    "warmup": {"presets": [], "total_s": 0.0},
+    "jobs_served": 0,
+}
+
+
+def _parse_warmup_presets(spec):
+    presets = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        parts = [int(p) for p in entry.split(":")]
+        if len(parts) not in (1, 3):
+            raise ValueError(f"Invalid warmup preset '{entry}', expected size or size:ss_steps:slat_steps")
+        presets.append({
+            "size": parts[0],
+            "ss_steps": parts[1] if len(parts) == 3 else None,
+            "slat_steps": parts[2] if len(parts) == 3 else None,
+        })
+    return presets
+
+
+def _synthetic_image(size):
+    """A shaded sphere on white, so the sparse structure stage has something to occupy."""
+    ys, xs = torch.meshgrid(torch.linspace(-1, 1, size), torch.linspace(-1, 1, size), indexing="ij")
+    r2 = (xs ** 2 + ys ** 2) / 0.6 ** 2
+    shade = (0.35 + 0.5 * (1 - r2).clamp(min=0).sqrt() - 0.15 * xs).clamp(0, 1)
+    value = torch.where(r2 <= 1, shade, torch.ones_like(shade))
+    pixels = (value * 255).to(torch.uint8)[..., None].expand(-1, -1, 3).contiguous()
+    return Image.fromarray(pixels.numpy())
+
+
+def _warmup(pipe, presets):
+    """
+    Run each preset through the pipeline stages of Hi3DGenPipeline.run and the
+    response builder, so that CUDA context, kernel selection / JIT, graph capture
+    and lazy imports happen here instead of in the first job. Records per-stage
+    timings in WORKER_STATE.
+    """
+    def sync():
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    total_start = time.perf_counter()
+    for preset in presets:
+        ss_params = {"steps": preset["ss_steps"]} if preset["ss_steps"] else {}
+        slat_params = {"steps": preset["slat_steps"]} if preset["slat_steps"] else {}
+        record = {**preset, "stages": {}}
+        stages = record["stages"]
+        last = time.perf_counter()
+
+        def lap(name):
+            nonlocal last
+            sync()
+            now = time.perf_counter()
+            stages[name] = round(now - last, 3)
+            last = now
+
+        try:
+            with torch.no_grad():
+                image = _synthetic_image(preset["size"])
+                if WARMUP_PREPROCESS:
+                    image = pipe.preprocess_images([image])
+                    lap("preprocess")
+                cond = pipe.get_cond(image if isinstance(image, torch.Tensor) else [image])
+                lap("cond")
+                torch.manual_seed(0)
+                coords = pipe.sample_sparse_structure(cond, 1, ss_params)
+                lap("sparse_structure")
+                if coords.shape[0] == 0:
+                    raise RuntimeError("synthetic image produced no occupied voxels")
+                slat = pipe.sample_slat(cond, coords, slat_params)
+                lap("slat")
+                result = pipe.decode_slat(slat, ['mesh'])
+                lap("decode")
+            _build_response(result)
+            lap("response")
+        except Exception as e:
+            record["error"] = str(e)
+            print(f"[Worker][WARN] Warmup preset {preset} failed: {e}")
+        record["total_s"] = round(sum(stages.values()), 3)
+        WORKER_STATE["warmup"]["presets"].append(record)
+        print(f"[Worker] Warmup {preset}: {stages}")
+
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    WORKER_STATE["warmup"]["total_s"] = round(time.perf_counter() - total_start, 3)
+    print(f"[Worker] Warmup finished in {WORKER_STATE['warmup']['total_s']}s")
+
+
+def _worker_debug():
+    return {
+        "ready": WORKER_STATE["ready"],
+        "uptime_s": round(time.time() - WORKER_STATE["started_at"], 1),
+        "jobs_served": WORKER_STATE["jobs_served"],
+        "warmup": WORKER_STATE["warmup"],
+    }
+
+# -----------------------------------------------------------------------------
+# Request batching
+# -----------------------------------------------------------------------------
+
+# Max number of jobs sharing one pipeline run, and how long the first job of a
+# batch waits for company. BATCH_MAX_SIZE=1 disables batching.
+BATCH_MAX_SIZE = max(1, int(os.environ.get("BATCH_MAX_SIZE", "4")))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+# Upper bound on num_variants per request (all variants share one pipeline run)
+MAX_VARIANTS = max(1, int(os.environ.get("MAX_VARIANTS", "8")))
+
+
+class _BatchJob:
+    def __init__(self, key, image, seed, params, variant_seeds=None):
+        self.key = key
+        self.image = image
+        self.seed = seed
+        self.params = params
+        self.variant_seeds = variant_seeds
+        self.future = Future()
+
+
+class JobBatcher:
+    """
+    Collects concurrent jobs on a background thread and runs them through
+    Hi3DGenPipeline.run_batch together.
+
+    The first job of a batch waits at most max_wait_ms for more jobs. Only
+    jobs with the same batch key (i.e. the same run_batch parameters) share
+    a batch; the others are kept for the next one.
+    """
+
+    def __init__(self, pipe, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.pipe = pipe
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._deferred = []
+        self._thread = threading.Thread(target=self._loop, name="hi3dgen-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, seed, **params):
+        """Queue a job and return a Future resolving to its run_batch result."""
+        key = repr(sorted(params.items()))
+        job = _BatchJob(key, image, seed, params)
+        self._queue.put(job)
+        return job.future
+
+    def submit_variants(self, image, seeds, **params):
+        """
+        Queue a multi-seed job and return a Future resolving to its run_variants
+        results. It is already batched over the seeds, so it runs on its own.
+        """
+        job = _BatchJob(object(), image, seeds[0], params, variant_seeds=seeds)
+        self._queue.put(job)
+        return job.future
+
+    def _collect(self):
+        first = self._deferred.pop(0) if self._deferred else self._queue.get()
+        batch = [first]
+        for job in list(self._deferred):
+            if len(batch) >= self.max_batch_size:
+                break
+            if job.key == first.key:
+                batch.append(job)
+                self._deferred.remove(job)
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job.key == first.key:
+                batch.append(job)
+            else:
+                self._deferred.append(job)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            print(f"[Worker] Running batch of {len(batch)} job(s)")
+            self._run(batch)
+
+    def _run(self, batch):
+        if batch[0].variant_seeds is not None:
+            job = batch[0]
+            try:
+                with torch.no_grad():
+                    job.future.set_result(self.pipe.run_variants(
+                        image=job.image,
+                        seeds=job.variant_seeds,
+                        **job.params
+                    ))
+            except Exception as e:
+                job.future.set_exception(e)
+            return
+        try:
+            with torch.no_grad():
+                results = self.pipe.run_batch(
+                    images=[job.image for job in batch],
+                    seeds=[job.seed for job in batch],
+                    **batch[0].params
+                )
+        except Exception as e:
+            if len(batch) > 1:
+                # Do not let one bad job (or an OOM on the whole batch) fail the others
+                print(f"[Worker][ERROR] Batch of {len(batch)} failed ({e}), retrying jobs one by one")
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+                for job in batch:
+                    self._run([job])
+            else:
+                batch[0].future.set_exception(e)
+            return
+        for job, result in zip(batch, results):
+            job.future.set_result(result)
+
+
+batcher = JobBatcher(hi3dgen_pipe) if hi3dgen_pipe is not None else None
+
+# -----------------------------------------------------------------------------
+# Result delivery
+# -----------------------------------------------------------------------------
+
+# "base64": GLB inline in the response. "url": GLB streamed to object storage
+# (utils/storage.py, S3_* env) and returned as a presigned URL; GLBs up to
+# INLINE_MAX_BYTES are still returned inline.
+RESULT_DELIVERY = os.environ.get("RESULT_DELIVERY", "base64").strip().lower()
+INLINE_MAX_BYTES = int(os.environ.get("INLINE_MAX_BYTES", str(256 << 10)))
+RESULT_URL_EXPIRES_S = int(os.environ.get("RESULT_URL_EXPIRES_S", "3600"))
+# Default GLB encoding ("none", "quantize" or "meshopt", see utils/glb.py);
+# requests can override it with glb_compression
+GLB_COMPRESSION = os.environ.get("GLB_COMPRESSION", "none").strip().lower()
+
+if RESULT_DELIVERY not in ("base64", "url"):
+    raise ValueError(f"Unknown RESULT_DELIVERY '{RESULT_DELIVERY}', expected 'base64' or 'url'")
+if RESULT_DELIVERY == "url":
+    # Only needed (and only configured) when results go to object storage
+    from utils import storage
+if GLB_COMPRESSION not in glb.COMPRESSION_LEVELS:
+    raise ValueError(f"Unknown GLB_COMPRESSION '{GLB_COMPRESSION}', expected one of {glb.COMPRESSION_LEVELS}")
+
+
+def _deliver_glb(glb_bytes, key):
+    """
+    Describe a GLB in the response: uploaded under `key` and referenced by a
+    presigned URL, or inline as base64 (small GLBs, base64 mode, or no key).
+    """
+    delivery = {
+        "mesh_glb_size_bytes": len(glb_bytes),
+        "mesh_glb_sha256": hashlib.sha256(glb_bytes).hexdigest(),
+    }
+    if RESULT_DELIVERY == "url" and key is not None and len(glb_bytes) > INLINE_MAX_BYTES:
+        delivery["mesh_glb_url"] = storage.upload_fileobj(
+            key,
+            io.BytesIO(glb_bytes),
+            content_type="model/gltf-binary",
+            expires_in=RESULT_URL_EXPIRES_S,
+        )
+        delivery["mesh_glb_key"] = key
+    else:
+        delivery["mesh_glb_base64"] = base64.b64encode(glb_bytes).decode("utf-8")
+    return delivery
+
 # -----------------------------------------------------------------------------
 # Job handler
 # -----------------------------------------------------------------------------
 
-def handler(event):
+def _build_response(result, key=None, compression=GLB_COMPRESSION):
+    """
+    Turn one pipeline result into the handler response (runs off the event loop).
+    `key` is the object storage key the GLB is uploaded under in url delivery,
+    `compression` the GLB encoding level.
+    """
+    # Extract mesh from result
+    if 'mesh' not in result or result['mesh'] is None:
+        raise RuntimeError("Hi3DGen returned empty mesh")
+    
+    mesh_result = result['mesh']
+    if isinstance(mesh_result, list):
+        # One entry per sample
+        if len(mesh_result) == 0:
+            raise RuntimeError("Hi3DGen returned empty mesh")
+        mesh_result = mesh_result[0]
+    
+    # -------------------------------------------------------------
+    # Clean and prepare mesh (welding, duplicate/degenerate faces,
+    # compaction, rezero and normals in one pass on the mesh's device)
+    # -------------------------------------------------------------
+    if hasattr(mesh_result, 'to_arrays'):
+        # MeshExtractResult object
+        vertices, faces, normals = mesh_result.to_arrays(transform_pose=False, rezero=True)
+    elif hasattr(mesh_result, 'vertices') and hasattr(mesh_result, 'faces'):
+        # trimesh.Trimesh or any other vertices/faces container
+        vertices, faces = mesh_result.vertices, mesh_result.faces
+        if not torch.is_tensor(vertices):
+            vertices = torch.from_numpy(np.asarray(vertices))
+        if not torch.is_tensor(faces):
+            faces = torch.from_numpy(np.asarray(faces))
+        vertices, faces, normals = clean_mesh(vertices, faces, rezero=True)
+        vertices, faces, normals = vertices.cpu().numpy(), faces.cpu().numpy(), normals.cpu().numpy()
+    else:
+        raise RuntimeError(f"Unknown mesh format: {type(mesh_result)}")
+    
+    # -------------------------------------------------------------
+    # Export GLB (mesh only)
+    # -------------------------------------------------------------
+    glb_bytes = glb.export_glb(vertices, faces, normals, compression)
+    delivery = _deliver_glb(glb_bytes, key)
+    
+    print(f"[Worker] Generated mesh: {len(vertices)} vertices, {len(faces)} faces")
+    
+    return {
+        "status": "success",
+        **delivery,
+        "debug": {
+            "vertices": int(len(vertices)),
+            "faces": int(len(faces)),
+            "device": DEVICE,
+            "glb_size_bytes": len(glb_bytes),
+            "glb_compression": compression,
+            "cond_cache": hi3dgen_pipe.cond_cache.stats(),
+            "worker": _worker_debug(),
+        }
+    }
+
+
+async def handler(event):
     """
     Phase 1:
-    - Input: image_base64 (required), seed (optional), resolution (optional)
-    - Output: GLB (mesh only, no textures)
+    - Input: image_base64 (required), seed (optional), resolution (optional),
+      num_variants (optional, default 1), glb_compression (optional, "none",
+      "quantize" or "meshopt", default GLB_COMPRESSION)
+    - Output: GLB (mesh only, no textures) as mesh_glb_base64, or as
+      mesh_glb_url with RESULT_DELIVERY=url, plus its size and sha256; with
+      num_variants > 1, one GLB per variant under "variants", generated with
+      seeds seed, seed + 1, ...
     """
     
     if hi3dgen_pipe is None:
@@ -123,13 +509,20 @@ def handler(event):
         # Parse input
         # -------------------------------------------------------------
         input_data = event.get("input", {})
+        job_id = event.get("id") or uuid.uuid4().hex
         
         image_b64 = input_data.get("image_base64", None)
         seed_raw = input_data.get("seed", -1)
         resolution = int(input_data.get("resolution", 512))
+        num_variants = int(input_data.get("num_variants", 1))
+        compression = str(input_data.get("glb_compression", GLB_COMPRESSION)).lower()
         
         if image_b64 is None:
             raise ValueError("Missing image_base64 in input")
+        if not 1 <= num_variants <= MAX_VARIANTS:
+            raise ValueError(f"num_variants must be between 1 and {MAX_VARIANTS}")
+        if compression not in glb.COMPRESSION_LEVELS:
+            raise ValueError(f"glb_compression must be one of {glb.COMPRESSION_LEVELS}")
         
         # Handle seed: if < 0, generate random seed (Hi3DGen doesn't handle None)
         if seed_raw is None or seed_raw < 0:
@@ -142,79 +535,44 @@ def handler(event):
         image_bytes = base64.b64decode(image_b64)
         image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
         
-        print(f"[Worker] Processing image: {image.size}, seed={seed}, resolution={resolution}")
+        print(f"[Worker] Processing image: {image.size}, seed={seed}, resolution={resolution}, num_variants={num_variants}")
         
         # -------------------------------------------------------------
         # Run Hi3DGen (geometry only)
         # -------------------------------------------------------------
         print("[Worker] Running Hi3DGen inference...")
         
-        with torch.no_grad():
-            # For Phase 1, skip image preprocessing (BiRefNet) to avoid dependency issues
-            # Preprocessing can be enabled later when BiRefNet model is available
-            result = hi3dgen_pipe.run(
-                image=image,
-                num_samples=1,
-                seed=seed,  # Always pass a valid integer seed
+        # For Phase 1, skip image preprocessing (BiRefNet) to avoid dependency issues
+        # Preprocessing can be enabled later when BiRefNet model is available
+        if num_variants > 1:
+            # Conditioning and both sampling stages are shared across the seeds
+            seeds = [(seed + i) % 2**31 for i in range(num_variants)]
+            future = batcher.submit_variants(
+                image,
+                seeds,
                 formats=['mesh'],
-                preprocess_image=False  # Skip BiRefNet preprocessing for Phase 1
+                preprocess_image=False
             )
+            results = await asyncio.wrap_future(future)
+            responses = await asyncio.gather(*[
+                asyncio.to_thread(_build_response, result, f"jobs/{job_id}/mesh_{i}.glb", compression)
+                for i, result in enumerate(results)
+            ])
+            WORKER_STATE["jobs_served"] += 1
+            for variant_seed, response in zip(seeds, responses):
+                response["seed"] = variant_seed
+            return {"status": "success", "variants": responses}
+
+        future = batcher.submit(
+            image,
+            seed,  # Always pass a valid integer seed
+            formats=['mesh'],
+            preprocess_image=False  # Skip BiRefNet preprocessing for Phase 1
+        )
+        result = await asyncio.wrap_future(future)
         
-        # Extract mesh from result
-        if 'mesh' not in result or result['mesh'] is None:
-            raise RuntimeError("Hi3DGen returned empty mesh")
-        
-        mesh_result = result['mesh']
-        
-        # Convert to trimesh if needed
-        if hasattr(mesh_result, 'to_trimesh'):
-            # MeshExtractResult object - convert to trimesh
-            mesh = mesh_result.to_trimesh(transform_pose=False)
-        elif isinstance(mesh_result, trimesh.Trimesh):
-            # Already a trimesh object
-            mesh = mesh_result
-        else:
-            # Try to extract vertices and faces
-            if hasattr(mesh_result, 'vertices') and hasattr(mesh_result, 'faces'):
-                vertices = mesh_result.vertices
-                faces = mesh_result.faces
-                if hasattr(vertices, 'detach'):
-                    vertices = vertices.detach().cpu().numpy()
-                if hasattr(faces, 'detach'):
-                    faces = faces.detach().cpu().numpy()
-                mesh = trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
-            else:
-                raise RuntimeError(f"Unknown mesh format: {type(mesh_result)}")
-        
-        # -------------------------------------------------------------
-        # Clean and prepare mesh
-        # -------------------------------------------------------------
-        mesh.remove_duplicate_faces()
-        mesh.remove_degenerate_faces()
-        mesh.remove_unreferenced_vertices()
-        mesh.rezero()
-        
-        # Compute normals for Blender sanity
-        _ = mesh.vertex_normals
-        
-        # -------------------------------------------------------------
-        # Export GLB (mesh only)
-        # -------------------------------------------------------------
-        glb_bytes = trimesh.exchange.gltf.export_glb(mesh)
-        glb_b64 = base64.b64encode(glb_bytes).decode("utf-8")
-        
-        print(f"[Worker] Generated mesh: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
-        
-        return {
-            "status": "success",
-            "mesh_glb_base64": glb_b64,
-            "debug": {
-                "vertices": int(len(mesh.vertices)),
-                "faces": int(len(mesh.faces)),
-                "device": DEVICE,
-                "glb_size_bytes": len(glb_bytes)
-            }
-        }
+        WORKER_STATE["jobs_served"] += 1
+        return await asyncio.to_thread(_build_response, result, f"jobs/{job_id}/mesh.glb", compression)
         
     except Exception as e:
         import traceback
@@ -235,5 +593,31 @@ def handler(event):
 # RunPod entry
 # -----------------------------------------------------------------------------
 
+if hi3dgen_pipe is not None:
+    # A bad WARMUP_PRESETS or a failing warmup must not keep the worker from serving jobs
+    try:
+        _warmup(hi3dgen_pipe, _parse_warmup_presets(WARMUP_PRESETS))
+    except Exception as e:
+        WORKER_STATE["warmup"]["error"] = str(e)
+        print(f"[Worker][WARN] Warmup skipped: {e}")
+
+    # Written after warmup, so it records the state the worker serves with
+    if snapshot_dir is not None and not restored_from_snapshot:
+        try:
+            hi3dgen_pipe.save_snapshot(snapshot_dir)
+            print(f"[Worker] Wrote snapshot to {snapshot_dir}")
+        except Exception as e:
+            print(f"[Worker][WARN] Failed to write snapshot: {e}")
+    WORKER_STATE["ready"] = True
+
+
+def concurrency_modifier(current_concurrency):
+    """Let RunPod hand us enough concurrent jobs to fill a batch."""
+    return BATCH_MAX_SIZE
+
+
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler})
+    runpod.serverless.start({
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier,
+    })
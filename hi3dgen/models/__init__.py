@@ -26,7 +26,11 @@
 # This file has been modified by Chongjie Ye on 2025/04/10
 # Original file was released under MIT, with the full license text # available at https://github.com/atong01/conditional-flow-matching/blob/1.0.7/LICENSE.
 # This modified file is released under the same license.
+from typing import *
+from contextlib import contextmanager
 import importlib
+import threading
+import torch
 
 __attributes = {
     'SparseStructureEncoder': 'sparse_structure_vae',
@@ -57,18 +61,96 @@ def __getattr__(name):
     return globals()[name]
 
 
-def from_pretrained(path: str, **kwargs):
+_empty_weights_state = threading.local()
+_empty_weights_lock = threading.Lock()
+_empty_weights_users = 0
+_register_parameter = torch.nn.Module.register_parameter
+
+
+def _register_empty_parameter(module, name, param):
+    if getattr(_empty_weights_state, 'enabled', False) and param is not None and param.device.type != 'meta':
+        param = torch.nn.Parameter(param.to('meta'), requires_grad=param.requires_grad)
+    _register_parameter(module, name, param)
+
+
+@contextmanager
+def empty_weights():
+    """
+    Create the parameters of modules built in this thread inside this context on the
+    meta device.
+
+    Parameter initialization then costs nothing, while buffers and plain tensor
+    attributes computed in constructors stay real. Safe to use from several threads.
+    """
+    global _empty_weights_users
+    with _empty_weights_lock:
+        if _empty_weights_users == 0:
+            torch.nn.Module.register_parameter = _register_empty_parameter
+        _empty_weights_users += 1
+    _empty_weights_state.enabled = True
+    try:
+        yield
+    finally:
+        _empty_weights_state.enabled = False
+        with _empty_weights_lock:
+            _empty_weights_users -= 1
+            if _empty_weights_users == 0:
+                torch.nn.Module.register_parameter = _register_parameter
+
+
+def load_weights(
+    model: torch.nn.Module,
+    model_file: str,
+    device: Optional[Union[str, torch.device]] = None,
+    prefix: str = '',
+) -> torch.nn.Module:
+    """
+    Assign the weights of a (possibly meta-initialized) model from a safetensors file.
+
+    Tensors are memory-mapped (or loaded straight to `device`), cast to the dtypes the
+    model was built with, and attached without an extra copy.
+
+    Args:
+        model: The model to load the weights into.
+        model_file: The safetensors file.
+        device: The device to load the weights to. Defaults to CPU.
+        prefix: Only load the keys starting with this prefix, with the prefix removed.
+    """
+    from safetensors import safe_open
+    # Keep the dtypes chosen by the constructor (e.g. fp16 blocks)
+    targets = {**dict(model.named_parameters()), **dict(model.named_buffers())}
+    device = torch.device('cpu' if device is None else device)
+    state_dict = {}
+    with safe_open(model_file, framework='pt', device=str(device)) as f:
+        for key in f.keys():
+            if not key.startswith(prefix):
+                continue
+            tensor = f.get_tensor(key)
+            key = key[len(prefix):]
+            if key in targets:
+                tensor = tensor.to(targets[key].dtype)
+            state_dict[key] = tensor
+    model.load_state_dict(state_dict, assign=True)
+    model.to(device)
+    return model
+
+
+def from_pretrained(path: str, device: Optional[Union[str, torch.device]] = None, **kwargs):
     """
     Load a model from a pretrained checkpoint.
 
+    The model is built with its parameters on the meta device (skipping their random
+    initialization) and the checkpoint tensors, memory-mapped from the safetensors
+    file, are assigned to it directly instead of being copied into initialized weights.
+
     Args:
         path: The path to the checkpoint. Can be either local path or a Hugging Face model name.
               NOTE: config file and model file should take the name f'{path}.json' and f'{path}.safetensors' respectively.
+        device: The device to load the weights to. Defaults to CPU.
         **kwargs: Additional arguments for the model constructor.
     """
     import os
     import json
-    from safetensors.torch import load_file
     is_local = os.path.exists(f"{path}.json") and os.path.exists(f"{path}.safetensors")
 
     if is_local:
@@ -84,9 +166,11 @@ def from_pretrained(path: str, **kwargs):
 
     with open(config_file, 'r') as f:
         config = json.load(f)
-    model = __getattr__(config['name'])(**config['args'], **kwargs)
-    model.load_state_dict(load_file(model_file))
+    with empty_weights():
+        model = __getattr__(config['name'])(**config['args'], **kwargs)
+    model.pretrained_config = {'name': config['name'], 'args': {**config['args'], **kwargs}}
 
+    load_weights(model, model_file, device)
     return model
 
 
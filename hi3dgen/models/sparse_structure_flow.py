@@ -201,7 +201,7 @@ class SparseStructureFlowModel(nn.Module):
         nn.init.constant_(self.out_layer.weight, 0)
         nn.init.constant_(self.out_layer.bias, 0)
 
-    def forward(self, x: torch.Tensor, t: torch.Tensor, cond: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, t: torch.Tensor, cond: torch.Tensor, kv_cache=None) -> torch.Tensor:
         assert [*x.shape] == [x.shape[0], self.in_channels, *[self.resolution] * 3], \
                 f"Input shape mismatch, got {x.shape}, expected {[x.shape[0], self.in_channels, *[self.resolution] * 3]}"
 
@@ -215,9 +215,12 @@ class SparseStructureFlowModel(nn.Module):
             t_emb = self.adaLN_modulation(t_emb)
         t_emb = t_emb.type(self.dtype)
         h = h.type(self.dtype)
-        cond = cond.type(self.dtype)
+        if kv_cache is not None:
+            cond = kv_cache.memo(('cast', self.dtype), [cond], lambda: cond.type(self.dtype))
+        else:
+            cond = cond.type(self.dtype)
         for block in self.blocks:
-            h = block(h, t_emb, cond)
+            h = block(h, t_emb, cond, kv_cache=kv_cache)
         h = h.type(x.dtype)
         h = F.layer_norm(h, h.shape[-1:])
         h = self.out_layer(h)
@@ -47,6 +47,7 @@ class SparseResBlock3d(nn.Module):
         out_channels: Optional[int] = None,
         downsample: bool = False,
         upsample: bool = False,
+        indice_key: Optional[str] = None,
     ):
         super().__init__()
         self.channels = channels
@@ -59,8 +60,8 @@ class SparseResBlock3d(nn.Module):
 
         self.norm1 = LayerNorm32(channels, elementwise_affine=True, eps=1e-6)
         self.norm2 = LayerNorm32(self.out_channels, elementwise_affine=False, eps=1e-6)
-        self.conv1 = sp.SparseConv3d(channels, self.out_channels, 3)
-        self.conv2 = zero_module(sp.SparseConv3d(self.out_channels, self.out_channels, 3))
+        self.conv1 = sp.SparseConv3d(channels, self.out_channels, 3, indice_key=indice_key)
+        self.conv2 = zero_module(sp.SparseConv3d(self.out_channels, self.out_channels, 3, indice_key=indice_key))
         self.emb_layers = nn.Sequential(
             nn.SiLU(),
             nn.Linear(emb_channels, 2 * self.out_channels, bias=True),
@@ -152,12 +153,13 @@ class SLatFlowModel(nn.Module):
 
         self.input_layer = sp.SparseLinear(in_channels, io_block_channels[0])
         self.input_blocks = nn.ModuleList([])
-        for chs, next_chs in zip(io_block_channels, io_block_channels[1:] + [model_channels]):
+        for i, (chs, next_chs) in enumerate(zip(io_block_channels, io_block_channels[1:] + [model_channels])):
             self.input_blocks.extend([
                 SparseResBlock3d(
                     chs,
                     model_channels,
                     out_channels=chs,
+                    indice_key=f"res_{resolution >> i}",
                 )
                 for _ in range(num_io_res_blocks-1)
             ])
@@ -167,6 +169,7 @@ class SLatFlowModel(nn.Module):
                     model_channels,
                     out_channels=next_chs,
                     downsample=True,
+                    indice_key=f"res_{resolution >> (i + 1)}",
                 )
             )
             
@@ -187,13 +190,15 @@ class SLatFlowModel(nn.Module):
         ])
 
         self.out_blocks = nn.ModuleList([])
-        for chs, prev_chs in zip(reversed(io_block_channels), [model_channels] + list(reversed(io_block_channels[1:]))):
+        for i, (chs, prev_chs) in enumerate(zip(reversed(io_block_channels), [model_channels] + list(reversed(io_block_channels[1:])))):
+            res = resolution >> (len(io_block_channels) - 1 - i)
             self.out_blocks.append(
                 SparseResBlock3d(
                     prev_chs * 2 if self.use_skip_connection else prev_chs,
                     model_channels,
                     out_channels=chs,
                     upsample=True,
+                    indice_key=f"res_{res}",
                 )
             )
             self.out_blocks.extend([
@@ -201,6 +206,7 @@ class SLatFlowModel(nn.Module):
                     chs * 2 if self.use_skip_connection else chs,
                     model_channels,
                     out_channels=chs,
+                    indice_key=f"res_{res}",
                 )
                 for _ in range(num_io_res_blocks-1)
             ])
@@ -259,13 +265,16 @@ class SLatFlowModel(nn.Module):
         nn.init.constant_(self.out_layer.weight, 0)
         nn.init.constant_(self.out_layer.bias, 0)
 
-    def forward(self, x: sp.SparseTensor, t: torch.Tensor, cond: torch.Tensor) -> sp.SparseTensor:
+    def forward(self, x: sp.SparseTensor, t: torch.Tensor, cond: torch.Tensor, kv_cache=None) -> sp.SparseTensor:
         h = self.input_layer(x).type(self.dtype)
         t_emb = self.t_embedder(t)
         if self.share_mod:
             t_emb = self.adaLN_modulation(t_emb)
         t_emb = t_emb.type(self.dtype)
-        cond = cond.type(self.dtype)
+        if kv_cache is not None:
+            cond = kv_cache.memo(('cast', self.dtype), [cond], lambda: cond.type(self.dtype))
+        else:
+            cond = cond.type(self.dtype)
 
         skips = []
         # pack with input blocks
@@ -276,7 +285,7 @@ class SLatFlowModel(nn.Module):
         if self.pe_mode == "ape":
             h = h + self.pos_embedder(h.coords[:, 1:]).type(self.dtype)
         for block in self.blocks:
-            h = block(h, t_emb, cond)
+            h = block(h, t_emb, cond, kv_cache=kv_cache)
 
         # unpack with output blocks
         for block, skip in zip(self.out_blocks, reversed(skips)):
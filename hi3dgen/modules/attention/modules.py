@@ -133,7 +133,16 @@ class MultiHeadAttention(nn.Module):
         if use_rope:
             self.rope = RotaryPositionEmbedder(channels)
     
-    def forward(self, x: torch.Tensor, context: Optional[torch.Tensor] = None, indices: Optional[torch.Tensor] = None) -> torch.Tensor:
+    def _context_kv(self, context: torch.Tensor) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
+        B, Lkv, _ = context.shape
+        kv = self.to_kv(context)
+        kv = kv.reshape(B, Lkv, 2, self.num_heads, -1)
+        if self.qk_rms_norm:
+            k, v = kv.unbind(dim=2)
+            return self.k_rms_norm(k), v
+        return kv
+
+    def forward(self, x: torch.Tensor, context: Optional[torch.Tensor] = None, indices: Optional[torch.Tensor] = None, kv_cache=None) -> torch.Tensor:
         B, L, C = x.shape
         if self._type == "self":
             qkv = self.to_qkv(x)
@@ -153,15 +162,15 @@ class MultiHeadAttention(nn.Module):
             elif self.attn_mode == "windowed":
                 raise NotImplementedError("Windowed attention is not yet implemented")
         else:
-            Lkv = context.shape[1]
             q = self.to_q(x)
-            kv = self.to_kv(context)
             q = q.reshape(B, L, self.num_heads, -1)
-            kv = kv.reshape(B, Lkv, 2, self.num_heads, -1)
+            if kv_cache is not None:
+                kv = kv_cache.memo(self, [context], lambda: self._context_kv(context))
+            else:
+                kv = self._context_kv(context)
             if self.qk_rms_norm:
                 q = self.q_rms_norm(q)
-                k, v = kv.unbind(dim=2)
-                k = self.k_rms_norm(k)
+                k, v = kv
                 h = scaled_dot_product_attention(q, k, v)
             else:
                 h = scaled_dot_product_attention(q, kv)
@@ -0,0 +1,61 @@
+# MIT License
+
+# Copyright (c) Microsoft
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Copyright (c) [2025] [Microsoft]
+# SPDX-License-Identifier: MIT
+from typing import *
+
+
+class CrossAttentionKVCache:
+    """
+    Per sampler run cache for tensors derived from the fixed conditioning.
+
+    The conditioning tokens do not change between sampler steps, so the cross-attention
+    keys/values projected from them (and any cast or concatenation of them) only need to
+    be computed once per run. Entries are keyed by the identity of their source tensors;
+    the cache keeps those tensors alive so their ids stay unique until `clear()`.
+    """
+    def __init__(self):
+        self._entries = {}
+
+    def memo(self, name: Hashable, tensors: Sequence[Any], fn: Callable[[], Any]) -> Any:
+        """
+        Return `fn()`, computed only once for the given name and source tensors.
+
+        Args:
+            name: What is being cached, e.g. the module computing it.
+            tensors: The tensors the cached value is derived from.
+            fn: Computes the value on a miss.
+        """
+        key = (name, *[id(x) for x in tensors])
+        if key not in self._entries:
+            self._entries[key] = (tuple(tensors), fn())
+        return self._entries[key][1]
+
+    def clear(self) -> None:
+        """
+        Release all cached tensors.
+        """
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
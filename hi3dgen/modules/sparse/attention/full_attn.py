@@ -23,6 +23,7 @@
 # Copyright (c) [2025] [Microsoft]
 # SPDX-License-Identifier: MIT
 from typing import *
+from functools import lru_cache
 import torch
 from .. import SparseTensor
 from .. import DEBUG, ATTN
@@ -31,6 +32,8 @@ if ATTN == 'xformers':
     import xformers.ops as xops
 elif ATTN == 'flash_attn':
     import flash_attn
+elif ATTN == 'sdpa':
+    from torch.nn.functional import scaled_dot_product_attention as sdpa
 else:
     raise ValueError(f"Unknown attention module: {ATTN}")
 
@@ -40,6 +43,90 @@ __all__ = [
 ]
 
 
+# The helpers below build small index tensors from Python sequence lengths. They are
+# memoized so that repeated calls (every layer of every sampler step) neither rebuild
+# them nor issue host-to-device copies.
+
+@lru_cache(maxsize=64)
+def _cu_seqlens(seqlen: Tuple[int, ...], device: torch.device) -> torch.Tensor:
+    """Cumulative sequence lengths, as expected by flash_attn's varlen kernels."""
+    return torch.cat([torch.tensor([0]), torch.cumsum(torch.tensor(seqlen), dim=0)]).int().to(device)
+
+
+@lru_cache(maxsize=64)
+def _block_diagonal_mask(q_seqlen: Tuple[int, ...], kv_seqlen: Optional[Tuple[int, ...]] = None):
+    """xformers attention bias of packed variable-length sequences."""
+    return xops.fmha.BlockDiagonalMask.from_seqlens(list(q_seqlen), None if kv_seqlen is None else list(kv_seqlen))
+
+
+def _padded_index(seqlen: Tuple[int, ...], L: int, device: torch.device) -> torch.Tensor:
+    """
+    Positions of the packed tokens of variable-length sequences in a padded [N * L] layout.
+    """
+    seqlen = torch.tensor(seqlen)
+    offsets = torch.cumsum(seqlen, dim=0) - seqlen
+    starts = torch.arange(len(seqlen)) * L - offsets
+    return (torch.arange(int(seqlen.sum())) + torch.repeat_interleave(starts, seqlen)).to(device)
+
+
+@lru_cache(maxsize=64)
+def _varlen_padding(
+    q_seqlen: Tuple[int, ...],
+    kv_seqlen: Tuple[int, ...],
+    device: torch.device,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Padded positions of the queries and keys, and the [N, 1, 1, L_KV] key padding mask."""
+    L_KV = max(kv_seqlen)
+    mask = torch.arange(L_KV) < torch.tensor(kv_seqlen)[:, None]
+    return (
+        _padded_index(q_seqlen, max(q_seqlen), device),
+        _padded_index(kv_seqlen, L_KV, device),
+        mask[:, None, None, :].to(device),
+    )
+
+
+def _sdpa_varlen(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    v: torch.Tensor,
+    q_seqlen: List[int],
+    kv_seqlen: List[int],
+) -> torch.Tensor:
+    """
+    Scaled dot product attention over packed variable-length sequences with
+    `torch.nn.functional.scaled_dot_product_attention`.
+
+    Sequences of equal length are attended as one batch. Otherwise they are padded to
+    the longest one and padded keys are masked out.
+
+    Args:
+        q (torch.Tensor): A [T_Q, H, Ci] tensor containing Qs.
+        k (torch.Tensor): A [T_KV, H, Ci] tensor containing Ks.
+        v (torch.Tensor): A [T_KV, H, Co] tensor containing Vs.
+        q_seqlen (List[int]): Length of each query sequence.
+        kv_seqlen (List[int]): Length of each key/value sequence.
+
+    Returns:
+        (torch.Tensor): A [T_Q, H, Co] tensor.
+    """
+    N = len(q_seqlen)
+    L_Q, L_KV = max(q_seqlen), max(kv_seqlen)
+    if all(l == L_Q for l in q_seqlen) and all(l == L_KV for l in kv_seqlen):
+        q = q.reshape(N, L_Q, *q.shape[1:])
+        k = k.reshape(N, L_KV, *k.shape[1:])
+        v = v.reshape(N, L_KV, *v.shape[1:])
+        mask = None
+        q_index = None
+    else:
+        q_index, kv_index, mask = _varlen_padding(tuple(q_seqlen), tuple(kv_seqlen), q.device)
+        q = q.new_zeros(N * L_Q, *q.shape[1:]).index_copy_(0, q_index, q).reshape(N, L_Q, *q.shape[1:])
+        k = k.new_zeros(N * L_KV, *k.shape[1:]).index_copy_(0, kv_index, k).reshape(N, L_KV, *k.shape[1:])
+        v = v.new_zeros(N * L_KV, *v.shape[1:]).index_copy_(0, kv_index, v).reshape(N, L_KV, *v.shape[1:])
+    out = sdpa(q.permute(0, 2, 1, 3), k.permute(0, 2, 1, 3), v.permute(0, 2, 1, 3), attn_mask=mask)  # [N, H, L_Q, Co]
+    out = out.permute(0, 2, 1, 3).reshape(N * L_Q, out.shape[1], out.shape[3])                       # [N * L_Q, H, Co]
+    return out if q_index is None else out[q_index]
+
+
 @overload
 def sparse_scaled_dot_product_attention(qkv: SparseTensor) -> SparseTensor:
     """
@@ -218,18 +305,24 @@ def sparse_scaled_dot_product_attention(*args, **kwargs):
         q = q.unsqueeze(0)
         k = k.unsqueeze(0)
         v = v.unsqueeze(0)
-        mask = xops.fmha.BlockDiagonalMask.from_seqlens(q_seqlen, kv_seqlen)
+        mask = _block_diagonal_mask(tuple(q_seqlen), tuple(kv_seqlen))
         out = xops.memory_efficient_attention(q, k, v, mask)[0]
     elif ATTN == 'flash_attn':
-        cu_seqlens_q = torch.cat([torch.tensor([0]), torch.cumsum(torch.tensor(q_seqlen), dim=0)]).int().to(device)
+        cu_seqlens_q = _cu_seqlens(tuple(q_seqlen), device)
         if num_all_args in [2, 3]:
-            cu_seqlens_kv = torch.cat([torch.tensor([0]), torch.cumsum(torch.tensor(kv_seqlen), dim=0)]).int().to(device)
+            cu_seqlens_kv = _cu_seqlens(tuple(kv_seqlen), device)
         if num_all_args == 1:
             out = flash_attn.flash_attn_varlen_qkvpacked_func(qkv, cu_seqlens_q, max(q_seqlen))
         elif num_all_args == 2:
             out = flash_attn.flash_attn_varlen_kvpacked_func(q, kv, cu_seqlens_q, cu_seqlens_kv, max(q_seqlen), max(kv_seqlen))
         elif num_all_args == 3:
             out = flash_attn.flash_attn_varlen_func(q, k, v, cu_seqlens_q, cu_seqlens_kv, max(q_seqlen), max(kv_seqlen))
+    elif ATTN == 'sdpa':
+        if num_all_args == 1:
+            q, k, v = qkv.unbind(dim=1)
+        elif num_all_args == 2:
+            k, v = kv.unbind(dim=1)
+        out = _sdpa_varlen(q, k, v, q_seqlen, kv_seqlen)
     else:
         raise ValueError(f"Unknown attention module: {ATTN}")
     
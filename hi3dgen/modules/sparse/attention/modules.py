@@ -126,7 +126,16 @@ class SparseMultiHeadAttention(nn.Module):
         qkv = qkv.replace(torch.stack([q, k, v], dim=1)) 
         return qkv
     
-    def forward(self, x: Union[SparseTensor, torch.Tensor], context: Optional[Union[SparseTensor, torch.Tensor]] = None) -> Union[SparseTensor, torch.Tensor]:
+    def _context_kv(self, context: Union[SparseTensor, torch.Tensor]) -> Union[SparseTensor, torch.Tensor]:
+        kv = self._linear(self.to_kv, context)
+        kv = self._fused_pre(kv, num_fused=2)
+        if self.qk_rms_norm:
+            k, v = kv.unbind(dim=1)
+            k = self.k_rms_norm(k)
+            kv = kv.replace(torch.stack([k.feats, v.feats], dim=1))
+        return kv
+
+    def forward(self, x: Union[SparseTensor, torch.Tensor], context: Optional[Union[SparseTensor, torch.Tensor]] = None, kv_cache=None) -> Union[SparseTensor, torch.Tensor]:
         if self._type == "self":
             qkv = self._linear(self.to_qkv, x)
             qkv = self._fused_pre(qkv, num_fused=3)
@@ -150,13 +159,12 @@ class SparseMultiHeadAttention(nn.Module):
         else:
             q = self._linear(self.to_q, x)
             q = self._reshape_chs(q, (self.num_heads, -1))
-            kv = self._linear(self.to_kv, context)
-            kv = self._fused_pre(kv, num_fused=2)
+            if kv_cache is not None:
+                kv = kv_cache.memo(self, [context], lambda: self._context_kv(context))
+            else:
+                kv = self._context_kv(context)
             if self.qk_rms_norm:
                 q = self.q_rms_norm(q)
-                k, v = kv.unbind(dim=1)
-                k = self.k_rms_norm(k)
-                kv = kv.replace(torch.stack([k.feats, v.feats], dim=1))
             h = sparse_scaled_dot_product_attention(q, kv)
         h = self._reshape_chs(h, (-1,))
         h = self._linear(self.to_out, h)
@@ -31,8 +31,12 @@ from .. import DEBUG, ATTN
 
 if ATTN == 'xformers':
     import xformers.ops as xops
+    from .full_attn import _block_diagonal_mask
 elif ATTN == 'flash_attn':
     import flash_attn
+    from .full_attn import _cu_seqlens
+elif ATTN == 'sdpa':
+    from .full_attn import _sdpa_varlen
 else:
     raise ValueError(f"Unknown attention module: {ATTN}")
 
@@ -63,7 +67,7 @@ def calc_serialization(
     serialize_mode: SerializeMode = SerializeMode.Z_ORDER,
     shift_sequence: int = 0,
     shift_window: Tuple[int, int, int] = (0, 0, 0)
-) -> Tuple[torch.Tensor, torch.Tensor, List[int]]:
+) -> Tuple[torch.Tensor, torch.Tensor, List[int], List[int]]:
     """
     Calculate serialization and partitioning for a set of coordinates.
 
@@ -75,14 +79,9 @@ def calc_serialization(
         shift_window (Tuple[int, int, int]): The shift of serialized coordinates.
 
     Returns:
-        (torch.Tensor, torch.Tensor): Forwards and backwards indices.
+        (torch.Tensor, torch.Tensor, List[int], List[int]): Forwards and backwards indices,
+            sequence lengths and the batch index of each sequence.
     """
-    fwd_indices = []
-    bwd_indices = []
-    seq_lens = []
-    seq_batch_indices = []
-    offsets = [0]
-    
     if 'vox2seq' not in globals():
         import vox2seq
 
@@ -99,44 +98,74 @@ def calc_serialization(
         code = vox2seq.encode(serialize_coords, mode='hilbert', permute=[1, 0, 2])
     else:
         raise ValueError(f"Unknown serialize mode: {serialize_mode}")
-    
-    for bi, s in enumerate(tensor.layout):
+
+    return _partition_serialized(code, tensor.layout, window_size, shift_sequence)
+
+
+def _partition_serialized(
+    code: torch.Tensor,
+    layout: List[slice],
+    window_size: int,
+    shift_sequence: int = 0,
+) -> Tuple[torch.Tensor, torch.Tensor, List[int], List[int]]:
+    """
+    Partition serialized batch items into windows, all items and windows at once.
+
+    A batch item of `n` points that fits in one window becomes a single sequence of
+    length `n`. Otherwise it is split into `ceil(n / window_size)` windows of equal
+    valid length, each padded to `window_size` by wrapping around the serialized order.
+    """
+    device = code.device
+
+    # Per-window table, built on the host from the layout
+    seq_lens, seq_batch_indices = [], []
+    win_start, win_num, win_idx, win_count = [], [], [], []
+    for bi, s in enumerate(layout):
         num_points = s.stop - s.start
         num_windows = (num_points + window_size - 1) // window_size
-        valid_window_size = num_points / num_windows
-        to_ordered = torch.argsort(code[s.start:s.stop])
-        if num_windows == 1:
-            fwd_indices.append(to_ordered)
-            bwd_indices.append(torch.zeros_like(to_ordered).scatter_(0, to_ordered, torch.arange(num_points, device=tensor.device)))
-            fwd_indices[-1] += s.start
-            bwd_indices[-1] += offsets[-1]
-            seq_lens.append(num_points)
-            seq_batch_indices.append(bi)
-            offsets.append(offsets[-1] + seq_lens[-1])
-        else:
-            # Partition the input
-            offset = 0
-            mids = [(i + 0.5) * valid_window_size + shift_sequence for i in range(num_windows)]
-            split = [math.floor(i * valid_window_size + shift_sequence) for i in range(num_windows + 1)]
-            bwd_index = torch.zeros((num_points,), dtype=torch.int64, device=tensor.device)
-            for i in range(num_windows):
-                mid = mids[i]
-                valid_start = split[i]
-                valid_end = split[i + 1]
-                padded_start = math.floor(mid - 0.5 * window_size)
-                padded_end = padded_start + window_size
-                fwd_indices.append(to_ordered[torch.arange(padded_start, padded_end, device=tensor.device) % num_points])
-                offset += valid_start - padded_start
-                bwd_index.scatter_(0, fwd_indices[-1][valid_start-padded_start:valid_end-padded_start], torch.arange(offset, offset + valid_end - valid_start, device=tensor.device))
-                offset += padded_end - valid_start
-                fwd_indices[-1] += s.start
-            seq_lens.extend([window_size] * num_windows)
-            seq_batch_indices.extend([bi] * num_windows)
-            bwd_indices.append(bwd_index + offsets[-1])
-            offsets.append(offsets[-1] + num_windows * window_size)
-
-    fwd_indices = torch.cat(fwd_indices)
-    bwd_indices = torch.cat(bwd_indices)
+        seq_lens.extend([num_points if num_windows == 1 else window_size] * num_windows)
+        seq_batch_indices.extend([bi] * num_windows)
+        win_start.extend([s.start] * num_windows)
+        win_num.extend([num_points] * num_windows)
+        win_idx.extend(range(num_windows))
+        win_count.extend([num_windows] * num_windows)
+    win_num = torch.tensor(win_num, dtype=torch.float64)
+    win_idx = torch.tensor(win_idx, dtype=torch.float64)
+    win_count = torch.tensor(win_count, dtype=torch.float64)
+    valid_window_size = win_num / win_count
+    single = win_count == 1
+    valid_start = torch.where(single, 0, torch.floor(win_idx * valid_window_size + shift_sequence)).long()
+    valid_end = torch.where(single, win_num, torch.floor((win_idx + 1) * valid_window_size + shift_sequence)).long()
+    padded_start = torch.where(single, 0, torch.floor((win_idx + 0.5) * valid_window_size + shift_sequence - 0.5 * window_size)).long()
+    seq_lens_t = torch.tensor(seq_lens)
+    seq_offsets = torch.cumsum(seq_lens_t, dim=0) - seq_lens_t
+    table = torch.stack([
+        torch.tensor(win_start), win_num.long(), padded_start,
+        valid_start - padded_start, valid_end - padded_start, seq_offsets,
+    ]).to(device)
+    M = sum(seq_lens)
+
+    # Serialized order of every batch item, as global indices
+    order = torch.argsort(code)
+    batch_idx = torch.repeat_interleave(
+        torch.arange(len(layout), device=device),
+        torch.tensor([s.stop - s.start for s in layout], device=device),
+        output_size=code.shape[0],
+    )
+    order = order[torch.argsort(batch_idx[order], stable=True)]
+
+    # Forward indices: slot k of a window reads serialized position padded_start + k
+    window_of_slot = torch.repeat_interleave(
+        torch.arange(len(seq_lens), device=device), seq_lens_t.to(device), output_size=M
+    )
+    start, num, pstart, vstart, vend, offset = table[:, window_of_slot]
+    slot = torch.arange(M, device=device) - offset
+    fwd_indices = order[start + (pstart + slot) % num]
+
+    # Backward indices: every point is read by exactly one non-padding slot
+    valid = (slot >= vstart) & (slot < vend)
+    bwd_indices = torch.empty(code.shape[0], dtype=torch.int64, device=device)
+    bwd_indices[fwd_indices[valid]] = torch.arange(M, device=device)[valid]
 
     return fwd_indices, bwd_indices, seq_lens, seq_batch_indices
     
@@ -192,6 +221,9 @@ def sparse_serialized_scaled_dot_product_self_attention(
             out = xops.memory_efficient_attention(q, k, v)          # [B, N, H, C]
         elif ATTN == 'flash_attn':
             out = flash_attn.flash_attn_qkvpacked_func(qkv_feats)   # [B, N, H, C]
+        elif ATTN == 'sdpa':
+            q, k, v = qkv_feats.reshape(B * N, 3, H, C).unbind(dim=1)  # [M, H, C]
+            out = _sdpa_varlen(q, k, v, seq_lens, seq_lens)         # [M, H, C]
         else:
             raise ValueError(f"Unknown attention module: {ATTN}")
         out = out.reshape(B * N, H, C)                              # [M, H, C]
@@ -201,12 +233,14 @@ def sparse_serialized_scaled_dot_product_self_attention(
             q = q.unsqueeze(0)                                      # [1, M, H, C]
             k = k.unsqueeze(0)                                      # [1, M, H, C]
             v = v.unsqueeze(0)                                      # [1, M, H, C]
-            mask = xops.fmha.BlockDiagonalMask.from_seqlens(seq_lens)
+            mask = _block_diagonal_mask(tuple(seq_lens))
             out = xops.memory_efficient_attention(q, k, v, mask)[0] # [M, H, C]
         elif ATTN == 'flash_attn':
-            cu_seqlens = torch.cat([torch.tensor([0]), torch.cumsum(torch.tensor(seq_lens), dim=0)], dim=0) \
-                        .to(qkv.device).int()
+            cu_seqlens = _cu_seqlens(tuple(seq_lens), qkv.device)
             out = flash_attn.flash_attn_varlen_qkvpacked_func(qkv_feats, cu_seqlens, max(seq_lens)) # [M, H, C]
+        elif ATTN == 'sdpa':
+            q, k, v = qkv_feats.unbind(dim=1)                       # [M, H, C]
+            out = _sdpa_varlen(q, k, v, seq_lens, seq_lens)         # [M, H, C]
 
     out = out[bwd_indices]      # [T, H, C]
 
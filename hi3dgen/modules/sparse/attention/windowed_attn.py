@@ -30,8 +30,12 @@ from .. import DEBUG, ATTN
 
 if ATTN == 'xformers':
     import xformers.ops as xops
+    from .full_attn import _block_diagonal_mask
 elif ATTN == 'flash_attn':
     import flash_attn
+    from .full_attn import _cu_seqlens
+elif ATTN == 'sdpa':
+    from .full_attn import _sdpa_varlen
 else:
     raise ValueError(f"Unknown attention module: {ATTN}")
 
@@ -134,6 +138,9 @@ def sparse_windowed_scaled_dot_product_self_attention(
             out = xops.memory_efficient_attention(q, k, v)          # [B, N, H, C]
         elif ATTN == 'flash_attn':
             out = flash_attn.flash_attn_qkvpacked_func(qkv_feats)   # [B, N, H, C]
+        elif ATTN == 'sdpa':
+            q, k, v = qkv_feats.reshape(B * N, 3, H, C).unbind(dim=1)  # [M, H, C]
+            out = _sdpa_varlen(q, k, v, seq_lens, seq_lens)         # [M, H, C]
         else:
             raise ValueError(f"Unknown attention module: {ATTN}")
         out = out.reshape(B * N, H, C)                              # [M, H, C]
@@ -143,12 +150,14 @@ def sparse_windowed_scaled_dot_product_self_attention(
             q = q.unsqueeze(0)                                      # [1, M, H, C]
             k = k.unsqueeze(0)                                      # [1, M, H, C]
             v = v.unsqueeze(0)                                      # [1, M, H, C]
-            mask = xops.fmha.BlockDiagonalMask.from_seqlens(seq_lens)
+            mask = _block_diagonal_mask(tuple(seq_lens))
             out = xops.memory_efficient_attention(q, k, v, mask)[0] # [M, H, C]
         elif ATTN == 'flash_attn':
-            cu_seqlens = torch.cat([torch.tensor([0]), torch.cumsum(torch.tensor(seq_lens), dim=0)], dim=0) \
-                        .to(qkv.device).int()
+            cu_seqlens = _cu_seqlens(tuple(seq_lens), qkv.device)
             out = flash_attn.flash_attn_varlen_qkvpacked_func(qkv_feats, cu_seqlens, max(seq_lens)) # [M, H, C]
+        elif ATTN == 'sdpa':
+            q, k, v = qkv_feats.unbind(dim=1)                       # [M, H, C]
+            out = _sdpa_varlen(q, k, v, seq_lens, seq_lens)         # [M, H, C]
 
     out = out[bwd_indices]      # [T, H, C]
 
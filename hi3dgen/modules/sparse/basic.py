@@ -23,11 +23,41 @@
 # Copyright (c) [2025] [Microsoft]
 # SPDX-License-Identifier: MIT
 from typing import *
+import itertools
+import weakref
 import torch
 import torch.nn as nn
 from . import BACKEND, DEBUG
 SparseTensorData = None # Lazy import
 
+# Batch sizes and spatial shapes of live coordinate tensors, by `id()`. Entries only hold
+# a weak reference to their coordinates and are dropped when the coordinates are freed.
+_COORDS_META: Dict[int, Tuple[weakref.ref, tuple]] = {}
+
+
+def _drop_coords_meta(key: int, ref: weakref.ref) -> None:
+    entry = _COORDS_META.get(key)
+    if entry is not None and entry[0] is ref:
+        del _COORDS_META[key]
+
+
+def _coords_meta(coords: torch.Tensor) -> Tuple[List[int], List[int]]:
+    """
+    Number of points per batch item and spatial shape of a coordinate tensor.
+
+    Both are fetched with a single host sync and memoized on the identity of `coords`
+    for as long as it is alive, so tensors built from the same coordinates do not sync again.
+    """
+    key = id(coords)
+    cached = _COORDS_META.get(key)
+    if cached is not None and cached[0]() is coords:
+        return cached[1]
+    DIM = coords.shape[1] - 1
+    meta = torch.cat([coords[:, 1:].max(0)[0].long() + 1, torch.bincount(coords[:, 0])]).tolist()
+    meta = (meta[DIM:], meta[:DIM])
+    _COORDS_META[key] = (weakref.ref(coords, lambda ref: _drop_coords_meta(key, ref)), meta)
+    return meta
+
 
 __all__ = [
     'SparseTensor',
@@ -40,7 +70,7 @@ __all__ = [
 
 class SparseTensor:
     """
-    Sparse tensor with support for both torchsparse and spconv backends.
+    Sparse tensor with support for the torchsparse, spconv and pure PyTorch (torch) backends.
     
     Parameters:
     - feats (torch.Tensor): Features of the sparse tensor.
@@ -68,6 +98,8 @@ class SparseTensor:
                 SparseTensorData = importlib.import_module('torchsparse').SparseTensor
             elif BACKEND == 'spconv':
                 SparseTensorData = importlib.import_module('spconv.pytorch').SparseConvTensor
+            elif BACKEND == 'torch':
+                SparseTensorData = TorchSparseTensorData
                 
         method_id = 0
         if len(args) != 0:
@@ -97,9 +129,11 @@ class SparseTensor:
             if BACKEND == 'torchsparse':
                 self.data = SparseTensorData(feats, coords, **kwargs)
             elif BACKEND == 'spconv':
-                spatial_shape = list(coords.max(0)[0] + 1)[1:]
+                spatial_shape = _coords_meta(coords)[1]
                 self.data = SparseTensorData(feats.reshape(feats.shape[0], -1), coords, spatial_shape, shape[0], **kwargs)
                 self.data._features = feats
+            elif BACKEND == 'torch':
+                self.data = SparseTensorData(feats, coords, shape[0])
         elif method_id == 1:
             data, shape, layout = args + (None,) * (3 - len(args))
             if 'data' in kwargs:
@@ -140,14 +174,15 @@ class SparseTensor:
         
     def __cal_shape(self, feats, coords):
         shape = []
-        shape.append(coords[:, 0].max().item() + 1)
+        shape.append(len(_coords_meta(coords)[0]))
         shape.extend([*feats.shape[1:]])
         return torch.Size(shape)
     
     def __cal_layout(self, coords, batch_size):
-        seq_len = torch.bincount(coords[:, 0], minlength=batch_size)
-        offset = torch.cumsum(seq_len, dim=0) 
-        layout = [slice((offset[i] - seq_len[i]).item(), offset[i].item()) for i in range(batch_size)]
+        seq_len = _coords_meta(coords)[0]
+        seq_len = seq_len + [0] * (batch_size - len(seq_len))
+        offset = [0] + list(itertools.accumulate(seq_len))
+        layout = [slice(offset[i], offset[i + 1]) for i in range(batch_size)]
         return layout
     
     @property
@@ -165,28 +200,28 @@ class SparseTensor:
     def feats(self) -> torch.Tensor:
         if BACKEND == 'torchsparse':
             return self.data.F
-        elif BACKEND == 'spconv':
+        elif BACKEND in ['spconv', 'torch']:
             return self.data.features
     
     @feats.setter
     def feats(self, value: torch.Tensor):
         if BACKEND == 'torchsparse':
             self.data.F = value
-        elif BACKEND == 'spconv':
+        elif BACKEND in ['spconv', 'torch']:
             self.data.features = value
 
     @property
     def coords(self) -> torch.Tensor:
         if BACKEND == 'torchsparse':
             return self.data.C
-        elif BACKEND == 'spconv':
+        elif BACKEND in ['spconv', 'torch']:
             return self.data.indices
         
     @coords.setter
     def coords(self, value: torch.Tensor):
         if BACKEND == 'torchsparse':
             self.data.C = value
-        elif BACKEND == 'spconv':
+        elif BACKEND in ['spconv', 'torch']:
             self.data.indices = value
 
     @property
@@ -254,7 +289,7 @@ class SparseTensor:
     def dense(self) -> torch.Tensor:
         if BACKEND == 'torchsparse':
             return self.data.dense()
-        elif BACKEND == 'spconv':
+        elif BACKEND in ['spconv', 'torch']:
             return self.data.dense()
 
     def reshape(self, *shape) -> 'SparseTensor':
@@ -294,6 +329,13 @@ class SparseTensor:
             new_data.int8_scale = self.data.int8_scale
             if coords is not None:
                 new_data.indices = coords
+        elif BACKEND == 'torch':
+            new_data = SparseTensorData(
+                feats,
+                self.data.indices if coords is None else coords,
+                self.data.batch_size,
+                indice_dict=self.data.indice_dict,
+            )
         new_tensor = SparseTensor(new_data, shape=torch.Size(new_shape), layout=self.layout, scale=self._scale, spatial_cache=self._spatial_cache)
         return new_tensor
 
@@ -413,6 +455,34 @@ class SparseTensor:
         return cur_scale_cache.get(key, None)
 
 
+class TorchSparseTensorData:
+    """
+    Sparse tensor data of the pure PyTorch backend, mirroring the parts of
+    `spconv.pytorch.SparseConvTensor` that SparseTensor relies on.
+
+    `indice_dict` holds the convolution rulebooks by `indice_key` and, as in spconv,
+    is shared between tensors derived from each other through `replace()`.
+    """
+    def __init__(self, features: torch.Tensor, indices: torch.Tensor, batch_size: int, indice_dict: Optional[dict] = None):
+        self.features = features
+        self.indices = indices
+        self.batch_size = batch_size
+        self.indice_dict = {} if indice_dict is None else indice_dict
+
+    @property
+    def spatial_shape(self) -> List[int]:
+        return _coords_meta(self.indices)[1]
+
+    def replace_feature(self, features: torch.Tensor) -> 'TorchSparseTensorData':
+        return TorchSparseTensorData(features, self.indices, self.batch_size, self.indice_dict)
+
+    def dense(self) -> torch.Tensor:
+        feats = self.features.reshape(self.features.shape[0], -1)
+        out = torch.zeros(self.batch_size, *self.spatial_shape, feats.shape[1], dtype=feats.dtype, device=feats.device)
+        out[tuple(self.indices.long().unbind(dim=-1))] = feats
+        return out.permute(0, 4, 1, 2, 3).contiguous()
+
+
 def sparse_batch_broadcast(input: SparseTensor, other: torch.Tensor) -> torch.Tensor:
     """
     Broadcast a 1D tensor to a sparse tensor along the batch dimension then perform an operation.
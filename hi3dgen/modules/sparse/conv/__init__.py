@@ -43,3 +43,5 @@ if BACKEND == 'torchsparse':
     from .conv_torchsparse import *
 elif BACKEND == 'spconv':
     from .conv_spconv import *
+elif BACKEND == 'torch':
+    from .conv_torch import *
@@ -0,0 +1,263 @@
+# MIT License
+
+# Copyright (c) Microsoft
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Copyright (c) Microsoft
+# SPDX-License-Identifier: MIT
+"""
+Sparse convolutions in pure PyTorch.
+
+Neighbors are found by encoding coordinates as linear keys and binary searching the
+sorted keys of the input. The resulting rulebook (input row, output row, kernel offset)
+is applied as one gather-GEMM-scatter per kernel offset. Weights use the spconv layout
+[out_channels, *kernel_size, in_channels], so checkpoints load unchanged.
+"""
+from typing import *
+import math
+import torch
+import torch.nn as nn
+from .. import SparseTensor
+
+
+__all__ = [
+    'SparseConv3d',
+    'SparseInverseConv3d',
+]
+
+
+def _kernel_offsets(kernel_size: Tuple[int, ...], dilation: Tuple[int, ...], device: torch.device) -> torch.Tensor:
+    """[K, 3] kernel offsets, in the order of the flattened weight."""
+    grids = torch.meshgrid(*[torch.arange(k, device=device) for k in kernel_size], indexing='ij')
+    return torch.stack([g.reshape(-1) * d for g, d in zip(grids, dilation)], dim=-1)
+
+
+def _encode(coords: torch.Tensor, extent: torch.Tensor) -> torch.Tensor:
+    """Linear keys of [..., 4] (batch, x, y, z) coordinates within `extent`."""
+    coords = coords.long()
+    return ((coords[..., 0] * extent[0] + coords[..., 1]) * extent[1] + coords[..., 2]) * extent[2] + coords[..., 3]
+
+
+def _lookup(keys: torch.Tensor, query: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Positions of `query` in the sorted `keys`, and whether they were found."""
+    idx = torch.searchsorted(keys, query).clamp(max=keys.shape[0] - 1)
+    return idx, keys[idx] == query
+
+
+def _split_rules(in_idx: torch.Tensor, out_idx: torch.Tensor, valid: torch.Tensor) -> List[Tuple[int, torch.Tensor, torch.Tensor]]:
+    """Turn [K, N] candidate pairs into a list of (offset, input rows, output rows)."""
+    counts = valid.sum(dim=1).tolist()
+    in_idx, out_idx = in_idx[valid], out_idx[valid]
+    rules, start = [], 0
+    for k, n in enumerate(counts):
+        if n > 0:
+            rules.append((k, in_idx[start:start + n], out_idx[start:start + n]))
+        start += n
+    return rules
+
+
+def submanifold_rules(
+    coords: torch.Tensor,
+    kernel_size: Tuple[int, ...],
+    dilation: Tuple[int, ...],
+) -> List[Tuple[int, torch.Tensor, torch.Tensor]]:
+    """
+    Rulebook of a submanifold convolution: outputs sit on the input coordinates.
+
+    Returns:
+        List of (kernel offset, input rows, output rows), skipping empty offsets.
+    """
+    device = coords.device
+    center = torch.tensor([(k - 1) // 2 * d for k, d in zip(kernel_size, dilation)], device=device)
+    offsets = _kernel_offsets(kernel_size, dilation, device) - center
+    reach = offsets.abs().max()
+    extent = coords[:, 1:].max(dim=0)[0].long() + 1 + 2 * reach
+    shifted = coords.long()
+    shifted[:, 1:] += reach
+    keys, order = torch.sort(_encode(shifted, extent))
+
+    query = shifted.unsqueeze(0).repeat(offsets.shape[0], 1, 1)
+    query[..., 1:] += offsets.unsqueeze(1)
+    idx, valid = _lookup(keys, _encode(query, extent))
+    out_idx = torch.arange(coords.shape[0], device=device).expand_as(idx)
+    return _split_rules(order[idx], out_idx, valid)
+
+
+def strided_rules(
+    coords: torch.Tensor,
+    kernel_size: Tuple[int, ...],
+    stride: Tuple[int, ...],
+    dilation: Tuple[int, ...],
+    padding: Tuple[int, ...],
+    spatial_shape: List[int],
+) -> Tuple[torch.Tensor, List[Tuple[int, torch.Tensor, torch.Tensor]]]:
+    """
+    Output coordinates and rulebook of a regular (strided) sparse convolution. An output
+    site exists wherever its receptive field holds at least one input.
+
+    Returns:
+        Output coordinates, sorted by batch then position, and the rulebook as a list of
+        (kernel offset, input rows, output rows).
+    """
+    device = coords.device
+    offsets = _kernel_offsets(kernel_size, dilation, device)
+    stride_t = torch.tensor(stride, device=device)
+    out_shape = torch.tensor([
+        (s + 2 * p - d * (k - 1) - 1) // st + 1
+        for s, p, d, k, st in zip(spatial_shape, padding, dilation, kernel_size, stride)
+    ], device=device)
+
+    pos = coords[:, 1:].long().unsqueeze(0) + torch.tensor(padding, device=device) - offsets.unsqueeze(1)    # [K, N, 3]
+    valid = ((pos % stride_t == 0) & (pos >= 0) & (pos // stride_t < out_shape)).all(dim=-1)
+    cand = torch.cat([coords[:, :1].long().unsqueeze(0).expand(offsets.shape[0], -1, -1), pos // stride_t], dim=-1)
+    cand_keys = _encode(cand, out_shape)
+    out_keys, inverse = torch.unique(cand_keys[valid], return_inverse=True)
+    out_idx = torch.zeros_like(cand_keys)
+    out_idx[valid] = inverse
+
+    out_coords = torch.stack([
+        out_keys // (out_shape[0] * out_shape[1] * out_shape[2]),
+        out_keys // (out_shape[1] * out_shape[2]) % out_shape[0],
+        out_keys // out_shape[2] % out_shape[1],
+        out_keys % out_shape[2],
+    ], dim=-1).int()
+    in_idx = torch.arange(coords.shape[0], device=device).expand_as(cand_keys)
+    return out_coords, _split_rules(in_idx, out_idx, valid)
+
+
+def apply_rules(
+    feats: torch.Tensor,
+    weight: torch.Tensor,
+    bias: Optional[torch.Tensor],
+    rules: List[Tuple[int, torch.Tensor, torch.Tensor]],
+    num_out: int,
+    transposed: bool = False,
+) -> torch.Tensor:
+    """
+    Gather-GEMM-scatter over a rulebook.
+
+    Args:
+        feats: [N_in, C_in] input features.
+        weight: [C_out, *kernel_size, C_in] convolution weight.
+        bias: [C_out] optional bias.
+        rules: List of (kernel offset, input rows, output rows).
+        num_out: Number of output rows.
+        transposed: Swap the input and output rows of the rules (inverse convolution).
+    """
+    weight = weight.reshape(weight.shape[0], -1, weight.shape[-1])     # [C_out, K, C_in]
+    out = feats.new_zeros(num_out, weight.shape[0])
+    for k, in_idx, out_idx in rules:
+        if transposed:
+            in_idx, out_idx = out_idx, in_idx
+        out.index_add_(0, out_idx, feats[in_idx] @ weight[:, k].t())
+    if bias is not None:
+        out += bias
+    return out
+
+
+class _SparseConvWeight(nn.Module):
+    """Parameters of a sparse convolution, named and laid out as in spconv."""
+    def __init__(self, in_channels, out_channels, kernel_size, bias=True):
+        super().__init__()
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = kernel_size
+        self.weight = nn.Parameter(torch.empty(out_channels, *kernel_size, in_channels))
+        self.bias = nn.Parameter(torch.empty(out_channels)) if bias else None
+        fan_in = in_channels * math.prod(kernel_size)
+        nn.init.kaiming_uniform_(self.weight.view(out_channels, -1), a=math.sqrt(5))
+        if self.bias is not None:
+            nn.init.uniform_(self.bias, -1 / math.sqrt(fan_in), 1 / math.sqrt(fan_in))
+
+
+def _triple(x) -> Tuple[int, int, int]:
+    return tuple(x) if isinstance(x, (list, tuple)) else (x, x, x)
+
+
+class SparseConv3d(nn.Module):
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dilation=1, padding=None, bias=True, indice_key=None):
+        super(SparseConv3d, self).__init__()
+        self.conv = _SparseConvWeight(in_channels, out_channels, _triple(kernel_size), bias)
+        self.stride = _triple(stride)
+        self.dilation = _triple(dilation)
+        self.padding = padding
+        self.indice_key = indice_key
+        self.subm = all(s == 1 for s in self.stride) and padding is None
+
+    def forward(self, x: SparseTensor) -> SparseTensor:
+        if self.subm:
+            if math.prod(self.conv.kernel_size) == 1:
+                out_feats = x.feats @ self.conv.weight.reshape(self.conv.out_channels, -1).t()
+                if self.conv.bias is not None:
+                    out_feats = out_feats + self.conv.bias
+                return x.replace(out_feats)
+            key = (self.indice_key, 'subm', self.conv.kernel_size, self.dilation)
+            rules = x.data.indice_dict.get(key) if self.indice_key is not None else None
+            if rules is None:
+                rules = submanifold_rules(x.coords, self.conv.kernel_size, self.dilation)
+                if self.indice_key is not None:
+                    x.data.indice_dict[key] = rules
+            return x.replace(apply_rules(x.feats, self.conv.weight, self.conv.bias, rules, x.feats.shape[0]))
+
+        key = (self.indice_key, 'conv', self.conv.kernel_size, self.stride, self.dilation)
+        cached = x.data.indice_dict.get(key) if self.indice_key is not None else None
+        if cached is None:
+            out_coords, rules = strided_rules(
+                x.coords, self.conv.kernel_size, self.stride, self.dilation,
+                _triple(self.padding or 0), x.data.spatial_shape,
+            )
+        else:
+            _, _, out_coords, rules = cached
+        out_feats = apply_rules(x.feats, self.conv.weight, self.conv.bias, rules, out_coords.shape[0])
+        out = SparseTensor(
+            out_feats, out_coords, shape=torch.Size([x.shape[0], self.conv.out_channels]),
+            scale=tuple([s * stride for s, stride in zip(x._scale, self.stride)]),
+            spatial_cache=x._spatial_cache,
+        )
+        out.data.indice_dict = x.data.indice_dict
+        if self.indice_key is not None:
+            # Kept for the SparseInverseConv3d sharing this indice_key
+            x.data.indice_dict[key] = (x.coords, x.layout, out_coords, rules)
+        return out
+
+
+class SparseInverseConv3d(nn.Module):
+    def __init__(self, in_channels, out_channels, kernel_size, stride=1, dilation=1, bias=True, indice_key=None):
+        super(SparseInverseConv3d, self).__init__()
+        self.conv = _SparseConvWeight(in_channels, out_channels, _triple(kernel_size), bias)
+        self.stride = _triple(stride)
+        self.indice_key = indice_key
+
+    def forward(self, x: SparseTensor) -> SparseTensor:
+        cached = next((
+            v for k, v in x.data.indice_dict.items()
+            if k[0] == self.indice_key and k[1] == 'conv' and k[2] == self.conv.kernel_size
+        ), None) if self.indice_key is not None else None
+        if cached is None:
+            raise ValueError(f'SparseInverseConv3d needs the rules of a SparseConv3d with indice_key={self.indice_key}')
+        coords, layout, _, rules = cached
+        out_feats = apply_rules(x.feats, self.conv.weight, self.conv.bias, rules, coords.shape[0], transposed=True)
+        out = SparseTensor(
+            out_feats, coords, shape=torch.Size([x.shape[0], self.conv.out_channels]), layout=layout,
+            scale=tuple([s // stride for s, stride in zip(x._scale, self.stride)]),
+            spatial_cache=x._spatial_cache,
+        )
+        out.data.indice_dict = x.data.indice_dict
+        return out
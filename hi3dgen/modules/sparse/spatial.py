@@ -34,10 +34,23 @@ __all__ = [
 ]
 
 
+def _structure(input: SparseTensor) -> SparseTensor:
+    """
+    A stand-in for `input` that keeps its coordinates, layout, scale and backend index maps
+    but not its features (a zero-stride view of a single zero), for caching across calls
+    without holding on to activations. Use it through `replace()`.
+    """
+    return input.replace(input.feats.new_zeros(()).expand(input.feats.shape))
+
+
 class SparseDownsample(nn.Module):
     """
     Downsample a sparse tensor by a factor of `factor`.
     Implemented as average pooling.
+
+    The pooling indices and the output structure are kept in the input's spatial cache,
+    so tensors sharing the same coordinates (e.g. across sampler steps) reuse them, along
+    with the index maps built on the output by keyed convolutions.
     """
     def __init__(self, factor: Union[int, Tuple[int, ...], List[int]]):
         super(SparseDownsample, self).__init__()
@@ -48,22 +61,21 @@ class SparseDownsample(nn.Module):
         factor = self.factor if isinstance(self.factor, tuple) else (self.factor,) * DIM
         assert DIM == len(factor), 'Input coordinates must have the same dimension as the downsample factor.'
 
+        cache = input.get_spatial_cache(f'downsample_{factor}')
+        if cache is not None:
+            idx, num, template = cache
+            return template.replace(self._pool(input.feats, idx, num))
+
         coord = list(input.coords.unbind(dim=-1))
         for i, f in enumerate(factor):
             coord[i+1] = coord[i+1] // f
 
-        MAX = [coord[i+1].max().item() + 1 for i in range(DIM)]
+        MAX = (torch.stack(coord[1:], dim=-1).max(dim=0)[0] + 1).tolist()
         OFFSET = torch.cumprod(torch.tensor(MAX[::-1]), 0).tolist()[::-1] + [1]
         code = sum([c * o for c, o in zip(coord, OFFSET)])
         code, idx = code.unique(return_inverse=True)
 
-        new_feats = torch.scatter_reduce(
-            torch.zeros(code.shape[0], input.feats.shape[1], device=input.feats.device, dtype=input.feats.dtype),
-            dim=0,
-            index=idx.unsqueeze(1).expand(-1, input.feats.shape[1]),
-            src=input.feats,
-            reduce='mean'
-        )
+        new_feats = self._pool(input.feats, idx, code.shape[0])
         new_coords = torch.stack(
             [code // OFFSET[0]] +
             [(code // OFFSET[i+1]) % MAX[i] for i in range(DIM)],
@@ -76,9 +88,21 @@ class SparseDownsample(nn.Module):
         out.register_spatial_cache(f'upsample_{factor}_coords', input.coords)
         out.register_spatial_cache(f'upsample_{factor}_layout', input.layout)
         out.register_spatial_cache(f'upsample_{factor}_idx', idx)
+        out.register_spatial_cache(f'upsample_{factor}_src', _structure(input))
+        input.register_spatial_cache(f'downsample_{factor}', (idx, code.shape[0], _structure(out)))
 
         return out
 
+    @staticmethod
+    def _pool(feats: torch.Tensor, idx: torch.Tensor, num: int) -> torch.Tensor:
+        return torch.scatter_reduce(
+            torch.zeros(num, feats.shape[1], device=feats.device, dtype=feats.dtype),
+            dim=0,
+            index=idx.unsqueeze(1).expand(-1, feats.shape[1]),
+            src=feats,
+            reduce='mean'
+        )
+
 
 class SparseUpsample(nn.Module):
     """
@@ -100,6 +124,10 @@ class SparseUpsample(nn.Module):
         if any([x is None for x in [new_coords, new_layout, idx]]):
             raise ValueError('Upsample cache not found. SparseUpsample must be paired with SparseDownsample.')
         new_feats = input.feats[idx]
+        src = input.get_spatial_cache(f'upsample_{factor}_src')
+        if src is not None:
+            # Keep the source structure's backend data so its index maps are reused.
+            return src.replace(new_feats)
         out = SparseTensor(new_feats, new_coords, input.shape, new_layout)
         out._scale = tuple([s * f for s, f in zip(input._scale, factor)])
         out._spatial_cache = input._spatial_cache
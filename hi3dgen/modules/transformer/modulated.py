@@ -153,7 +153,7 @@ class ModulatedTransformerCrossBlock(nn.Module):
                 nn.Linear(channels, 6 * channels, bias=True)
             )
 
-    def _forward(self, x: torch.Tensor, mod: torch.Tensor, context: torch.Tensor):
+    def _forward(self, x: torch.Tensor, mod: torch.Tensor, context: torch.Tensor, kv_cache=None):
         if self.share_mod:
             shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = mod.chunk(6, dim=1)
         else:
@@ -164,7 +164,7 @@ class ModulatedTransformerCrossBlock(nn.Module):
         h = h * gate_msa.unsqueeze(1)
         x = x + h
         h = self.norm2(x)
-        h = self.cross_attn(h, context)
+        h = self.cross_attn(h, context, kv_cache=kv_cache)
         x = x + h
         h = self.norm3(x)
         h = h * (1 + scale_mlp.unsqueeze(1)) + shift_mlp.unsqueeze(1)
@@ -173,9 +173,9 @@ class ModulatedTransformerCrossBlock(nn.Module):
         x = x + h
         return x
 
-    def forward(self, x: torch.Tensor, mod: torch.Tensor, context: torch.Tensor):
+    def forward(self, x: torch.Tensor, mod: torch.Tensor, context: torch.Tensor, kv_cache=None):
         if self.use_checkpoint:
-            return torch.utils.checkpoint.checkpoint(self._forward, x, mod, context, use_reentrant=False)
+            return torch.utils.checkpoint.checkpoint(self._forward, x, mod, context, kv_cache, use_reentrant=False)
         else:
-            return self._forward(x, mod, context)
+            return self._forward(x, mod, context, kv_cache)
         
\ No newline at end of file
@@ -43,12 +43,16 @@ class Pipeline:
             model.eval()
 
     @staticmethod
-    def from_pretrained(path: str) -> "Pipeline":
+    def from_pretrained(path: str, device: Optional[Union[str, torch.device]] = None) -> "Pipeline":
         """
         Load a pretrained model.
+
+        The models of the pipeline are loaded in parallel threads (reading the weights
+        releases the GIL), directly to `device` if given.
         """
         import os
         import json
+        from concurrent.futures import ThreadPoolExecutor
         is_local = os.path.exists(f"{path}/pipeline.json")
 
         if is_local:
@@ -60,10 +64,12 @@ class Pipeline:
         with open(config_file, 'r') as f:
             args = json.load(f)['args']
 
-        _models = {
-            k: models.from_pretrained(f"{path}/{v}")
-            for k, v in args['models'].items()
-        }
+        with ThreadPoolExecutor(max_workers=len(args['models'])) as pool:
+            futures = {
+                k: pool.submit(models.from_pretrained, f"{path}/{v}", device=device)
+                for k, v in args['models'].items()
+            }
+            _models = {k: future.result() for k, future in futures.items()}
 
         new_pipeline = Pipeline(_models)
         new_pipeline._pretrained_args = args
@@ -0,0 +1,137 @@
+# MIT License
+
+# Copyright (c) Microsoft
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Copyright (c) [2025] [Microsoft]
+# SPDX-License-Identifier: MIT
+from typing import *
+import hashlib
+import threading
+from collections import OrderedDict
+import torch
+
+
+class ConditioningCache:
+    """
+    LRU cache of image conditioning, keyed by a hash of the preprocessed image tensor.
+
+    Entries live on the device up to `device_budget_bytes`; the least recently used ones
+    are then moved to (pinned) CPU memory, which holds up to `cpu_budget_bytes` before
+    entries are dropped. A hit from CPU moves the entry back to the device.
+
+    Args:
+        device_budget_bytes: Bytes of conditioning kept on the device.
+        cpu_budget_bytes: Bytes of conditioning kept in CPU memory after spilling.
+    """
+    def __init__(self, device_budget_bytes: int = 512 << 20, cpu_budget_bytes: int = 2 << 30):
+        self.device_budget_bytes = device_budget_bytes
+        self.cpu_budget_bytes = cpu_budget_bytes
+        self._device = OrderedDict()
+        self._cpu = OrderedDict()
+        self._device_bytes = 0
+        self._cpu_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(image: torch.Tensor) -> str:
+        """
+        Content hash of a single preprocessed image tensor.
+        """
+        image = image.detach().to('cpu', torch.float32).contiguous()
+        digest = hashlib.blake2b(image.numpy().tobytes(), digest_size=16).hexdigest()
+        return f"{tuple(image.shape)}:{digest}"
+
+    @staticmethod
+    def _nbytes(value: torch.Tensor) -> int:
+        return value.numel() * value.element_size()
+
+    def get(self, key: str, device: torch.device) -> Optional[torch.Tensor]:
+        """
+        Return the cached conditioning on `device`, or None.
+        """
+        with self._lock:
+            if key in self._device:
+                self._device.move_to_end(key)
+                self.hits += 1
+                return self._device[key]
+            if key in self._cpu:
+                value = self._cpu.pop(key)
+                self._cpu_bytes -= self._nbytes(value)
+                self.hits += 1
+                value = value.to(device, non_blocking=True)
+                self._put_device(key, value)
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: torch.Tensor) -> None:
+        """
+        Insert conditioning for `key`.
+        The value is copied, so a slice of a batch does not keep the whole batch alive.
+        """
+        with self._lock:
+            if key in self._device or key in self._cpu:
+                return
+            self._put_device(key, value.detach().clone())
+
+    def _put_device(self, key: str, value: torch.Tensor) -> None:
+        self._device[key] = value
+        self._device_bytes += self._nbytes(value)
+        while self._device_bytes > self.device_budget_bytes and self._device:
+            old_key, old_value = self._device.popitem(last=False)
+            self._device_bytes -= self._nbytes(old_value)
+            self._put_cpu(old_key, old_value)
+
+    def _put_cpu(self, key: str, value: torch.Tensor) -> None:
+        if self._nbytes(value) > self.cpu_budget_bytes:
+            return
+        if value.device.type != 'cpu':
+            value = value.to('cpu')
+            if torch.cuda.is_available():
+                value = value.pin_memory()
+        self._cpu[key] = value
+        self._cpu_bytes += self._nbytes(value)
+        while self._cpu_bytes > self.cpu_budget_bytes:
+            _, old_value = self._cpu.popitem(last=False)
+            self._cpu_bytes -= self._nbytes(old_value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._device.clear()
+            self._cpu.clear()
+            self._device_bytes = 0
+            self._cpu_bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Counters for monitoring.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'device_entries': len(self._device),
+                'device_bytes': self._device_bytes,
+                'cpu_entries': len(self._cpu),
+                'cpu_bytes': self._cpu_bytes,
+            }
@@ -0,0 +1,131 @@
+# MIT License
+
+# Copyright (c) Microsoft
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Copyright (c) [2025] [Microsoft]
+# SPDX-License-Identifier: MIT
+from typing import *
+import os
+import torch
+import torch.nn as nn
+
+
+__all__ = [
+    'CompileModes',
+    'CUDAGraphRunner',
+    'compile_flow_model',
+]
+
+
+CompileModes = ('cuda_graph', 'torch_compile')
+
+
+class CUDAGraphRunner:
+    """
+    Runs a flow model with static input shapes through captured CUDA graphs.
+
+    A graph is captured on the first call for every distinct set of input shapes (e.g. a
+    single pass and a batched CFG pair) and replayed afterwards, with the inputs copied
+    into static buffers. Calls with inputs that are not on a CUDA device run eagerly.
+
+    Args:
+        model: The flow model, called as `model(x, t, cond)`.
+        warmup_iters: Eager iterations on a side stream before capturing.
+    """
+    def __init__(self, model: nn.Module, warmup_iters: int = 2):
+        self.model = model
+        self.warmup_iters = warmup_iters
+        self._graphs = {}
+        self._pool = None
+
+    def _capture(self, *inputs: torch.Tensor) -> Tuple[List[torch.Tensor], torch.Tensor, "torch.cuda.CUDAGraph"]:
+        static_inputs = [x.clone() for x in inputs]
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(self.warmup_iters):
+                self.model(*static_inputs)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        if self._pool is None:
+            self._pool = torch.cuda.graph_pool_handle()
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self._pool):
+            static_output = self.model(*static_inputs)
+        return static_inputs, static_output, graph
+
+    @torch.no_grad()
+    def __call__(self, x: torch.Tensor, t: torch.Tensor, cond: torch.Tensor, **kwargs) -> torch.Tensor:
+        # Cross-attention K/V caching happens on the host and cannot be captured;
+        # the graph recomputes them instead.
+        if not x.is_cuda:
+            return self.model(x, t, cond)
+        key = tuple((tuple(v.shape), v.dtype) for v in (x, t, cond))
+        if key not in self._graphs:
+            self._graphs[key] = self._capture(x, t, cond)
+        static_inputs, static_output, graph = self._graphs[key]
+        for static, value in zip(static_inputs, (x, t, cond)):
+            static.copy_(value)
+        graph.replay()
+        # The next replay overwrites the static output (e.g. the other half of a CFG pair)
+        return static_output.clone()
+
+
+def compile_flow_model(
+    model: nn.Module,
+    mode: Literal['cuda_graph', 'torch_compile'],
+    cache_dir: Optional[str] = None,
+) -> Callable:
+    """
+    Wrap a dense flow model for faster sampling.
+
+    Args:
+        model: The flow model.
+        mode: 'cuda_graph' captures the forward into CUDA graphs on the first call.
+            'torch_compile' compiles it with TorchInductor (including CUDA graphs).
+        cache_dir: For 'torch_compile', directory where compiled artifacts are cached
+            across processes, so later cold starts skip most of the compile time.
+            CUDA graphs cannot be stored and are recaptured in every process.
+
+    Returns:
+        A callable with the signature of the model's forward.
+    """
+    if mode == 'cuda_graph':
+        return CUDAGraphRunner(model)
+    elif mode == 'torch_compile':
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', os.path.join(cache_dir, 'inductor'))
+            os.environ.setdefault('TRITON_CACHE_DIR', os.path.join(cache_dir, 'triton'))
+            import torch._inductor.config as inductor_config
+            inductor_config.fx_graph_cache = True
+        compiled = torch.compile(model, mode='reduce-overhead', dynamic=False)
+
+        def forward(x, t, cond, **kwargs):
+            # kwargs such as the cross-attention K/V cache would only cause graph breaks.
+            # CUDA graph trees reuse the output buffer on the next replay, while samplers keep
+            # predictions across calls (CFG, multistep solvers), so hand out a copy.
+            if hasattr(torch.compiler, 'cudagraph_mark_step_begin'):
+                torch.compiler.cudagraph_mark_step_begin()
+            return compiled(x, t, cond).clone()
+        return forward
+    else:
+        raise ValueError(f"Unknown compile mode: {mode}, expected one of {CompileModes}")
@@ -31,6 +31,9 @@
 # This modified file is released under the same license.
 from typing import *
 from contextlib import contextmanager
+import os
+import json
+import itertools
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -39,6 +42,8 @@ from tqdm import tqdm
 from torchvision import transforms
 from PIL import Image
 from .base import Pipeline
+from .. import models as _models
+from .graph_capture import CompileModes, compile_flow_model
 from . import samplers
 from ..modules import sparse as sp
 
@@ -61,17 +66,21 @@ class Hi3DGenPipeline(Pipeline):
         self.sparse_structure_sampler_params = {}
         self.slat_sampler_params = {}
         self.slat_normalization = slat_normalization
+        self.cond_cache = None
+        self.compile_mode = None
+        self._compiled_sparse_structure_flow = None
         self._init_image_cond_model(image_cond_model)
 
     @staticmethod
-    def from_pretrained(path: str, weights_dir: str = None) -> "Hi3DGenPipeline":
+    def from_pretrained(path: str, weights_dir: str = None, device: Optional[Union[str, torch.device]] = None) -> "Hi3DGenPipeline":
         """
         Load a pretrained model.
 
         Args:
             path (str): The path to the model. Can be either local path or a Hugging Face repository.
+            device (str): The device to load the model weights to. Defaults to CPU.
         """
-        pipeline = super(Hi3DGenPipeline, Hi3DGenPipeline).from_pretrained(path)
+        pipeline = super(Hi3DGenPipeline, Hi3DGenPipeline).from_pretrained(path, device=device)
         pipeline.weights_dir = weights_dir if weights_dir is not None else path
         new_pipeline = Hi3DGenPipeline()
         new_pipeline.__dict__ = pipeline.__dict__
@@ -85,18 +94,29 @@ class Hi3DGenPipeline(Pipeline):
 
         new_pipeline.slat_normalization = args['slat_normalization']
 
+        new_pipeline.cond_cache = None
+        new_pipeline.compile_mode = None
+        new_pipeline._compiled_sparse_structure_flow = None
         new_pipeline._init_image_cond_model(args['image_cond_model'])
 
         return new_pipeline
     
-    def _init_image_cond_model(self, name: str):
+    def _init_image_cond_model(self, name: str, pretrained: bool = True):
         """
         Initialize the image conditioning model.
+
+        With `pretrained=False` only the architecture is built, with its parameters on
+        the meta device, to be filled from a snapshot.
         """
+        def load(*args, **kwargs):
+            if pretrained:
+                return torch.hub.load(*args, pretrained=True, **kwargs)
+            with _models.empty_weights():
+                return torch.hub.load(*args, pretrained=False, **kwargs)
         try:
-            dinov2_model = torch.hub.load(os.path.join(torch.hub.get_dir(), 'facebookresearch_dinov2_main'), name, source='local',pretrained=True)
+            dinov2_model = load(os.path.join(torch.hub.get_dir(), 'facebookresearch_dinov2_main'), name, source='local')
         except:
-            dinov2_model = torch.hub.load('facebookresearch/dinov2', name, pretrained=True)
+            dinov2_model = load('facebookresearch/dinov2', name)
         dinov2_model.eval()
         self.models['image_cond_model'] = dinov2_model
         transform = transforms.Compose([
@@ -104,6 +124,156 @@ class Hi3DGenPipeline(Pipeline):
         ])
         self.image_cond_model_transform = transform
 
+    SNAPSHOT_VERSION = 1
+
+    def save_snapshot(self, path: str) -> None:
+        """
+        Write the loaded pipeline to a single snapshot directory for fast restores.
+
+        The snapshot holds the weights of all models (including the image conditioning
+        model) in one safetensors file, already in the dtypes they run in, and
+        `snapshot.json` with the model configs, sampler setup, compile mode and the
+        kernel backends in effect. The directory is written next to `path` and renamed
+        into place, so a partially written snapshot is never picked up.
+
+        Args:
+            path (str): The snapshot directory.
+        """
+        from safetensors.torch import save_file
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        tensors = {
+            f"{name}.{key}": value.detach().to('cpu', copy=True).contiguous()
+            for name, model in self.models.items()
+            for key, value in model.state_dict().items()
+        }
+        save_file(tensors, os.path.join(tmp_path, 'weights.safetensors'))
+        del tensors
+
+        args = self._pretrained_args
+        config = {
+            'version': self.SNAPSHOT_VERSION,
+            'models': {
+                name: model.pretrained_config
+                for name, model in self.models.items() if name != 'image_cond_model'
+            },
+            'image_cond_model': args['image_cond_model'],
+            'sparse_structure_sampler': {
+                **args['sparse_structure_sampler'],
+                'params': self.sparse_structure_sampler_params,
+            },
+            'slat_sampler': {
+                **args['slat_sampler'],
+                'params': self.slat_sampler_params,
+            },
+            'slat_normalization': self.slat_normalization,
+            'weights_dir': getattr(self, 'weights_dir', None),
+            'compile_mode': self.compile_mode,
+            'kernels': self._kernel_config(),
+        }
+        with open(os.path.join(tmp_path, 'snapshot.json'), 'w') as f:
+            json.dump(config, f, indent=2)
+
+        if os.path.exists(path):
+            import shutil
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+    @staticmethod
+    def _kernel_config() -> dict:
+        from ..modules import attention
+        from ..modules.sparse import conv
+        return {
+            'sparse_backend': sp.BACKEND,
+            'sparse_attn': sp.ATTN,
+            'attn': attention.BACKEND,
+            'spconv_algo': conv.SPCONV_ALGO,
+        }
+
+    @staticmethod
+    def from_snapshot(
+        path: str,
+        device: Optional[Union[str, torch.device]] = None,
+        compile_cache_dir: Optional[str] = None,
+    ) -> "Hi3DGenPipeline":
+        """
+        Restore a pipeline written by `save_snapshot`.
+
+        All modules are built with their parameters on the meta device and filled from
+        the memory-mapped snapshot in one pass, directly on `device`.
+
+        Args:
+            path (str): The snapshot directory.
+            device (str): The device to restore the weights to. Defaults to CPU.
+            compile_cache_dir (str): Cache directory for the recorded compile mode, if any.
+        """
+        with open(os.path.join(path, 'snapshot.json'), 'r') as f:
+            config = json.load(f)
+        if config['version'] != Hi3DGenPipeline.SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {config['version']}")
+        kernels = Hi3DGenPipeline._kernel_config()
+        if kernels != config['kernels']:
+            # Backends are picked from the environment at import time
+            print(f"\033[93mWarning: snapshot was taken with kernels {config['kernels']}, running with {kernels}.\033[0m")
+
+        weights_file = os.path.join(path, 'weights.safetensors')
+        models = {}
+        for name, model_config in config['models'].items():
+            with _models.empty_weights():
+                model = getattr(_models, model_config['name'])(**model_config['args'])
+            model.pretrained_config = model_config
+            models[name] = _models.load_weights(model, weights_file, device, prefix=f"{name}.")
+
+        pipeline = Hi3DGenPipeline()
+        Pipeline.__init__(pipeline, models)
+        pipeline.sparse_structure_sampler = getattr(samplers, config['sparse_structure_sampler']['name'])(**config['sparse_structure_sampler']['args'])
+        pipeline.slat_sampler = getattr(samplers, config['slat_sampler']['name'])(**config['slat_sampler']['args'])
+        pipeline.slat_normalization = config['slat_normalization']
+        pipeline.cond_cache = None
+        pipeline.compile_mode = None
+        pipeline._compiled_sparse_structure_flow = None
+        pipeline.sparse_structure_sampler_params = config['sparse_structure_sampler']['params']
+        pipeline.slat_sampler_params = config['slat_sampler']['params']
+        pipeline.weights_dir = config['weights_dir']
+        pipeline._pretrained_args = {
+            'image_cond_model': config['image_cond_model'],
+            'sparse_structure_sampler': {k: v for k, v in config['sparse_structure_sampler'].items() if k != 'params'},
+            'slat_sampler': {k: v for k, v in config['slat_sampler'].items() if k != 'params'},
+        }
+
+        pipeline._init_image_cond_model(config['image_cond_model'], pretrained=False)
+        _models.load_weights(pipeline.models['image_cond_model'], weights_file, device, prefix='image_cond_model.')
+        if config['compile_mode'] is not None:
+            pipeline.set_compile_mode(config['compile_mode'], compile_cache_dir)
+        return pipeline
+
+    def set_compile_mode(
+        self,
+        compile_mode: Optional[Literal['cuda_graph', 'torch_compile']],
+        cache_dir: Optional[str] = None,
+    ) -> None:
+        """
+        Opt in to graph capture of the sparse structure flow model.
+
+        Its forward has static shapes, so it is captured on the first sampling run (the
+        warmup) and replayed afterwards. The conditional and unconditional CFG passes are
+        batched into one forward unless the sampler params say otherwise.
+
+        Args:
+            compile_mode (str): 'cuda_graph', 'torch_compile', or None to run eagerly.
+            cache_dir (str): Where 'torch_compile' caches compiled artifacts across processes.
+        """
+        if compile_mode is not None and compile_mode not in CompileModes:
+            raise ValueError(f"Unknown compile mode: {compile_mode}, expected one of {CompileModes}")
+        self.compile_mode = compile_mode
+        self._compiled_sparse_structure_flow = None
+        if compile_mode is not None:
+            self._compiled_sparse_structure_flow = compile_flow_model(
+                self.models['sparse_structure_flow_model'], compile_mode, cache_dir
+            )
+            self.sparse_structure_sampler_params.setdefault('batch_cfg', True)
+
     def preprocess_image(self, input: Image.Image, resolution=518) -> Image.Image:
         """
         Preprocess the input image using BiRefNet for background removal.
@@ -196,6 +366,73 @@ class Hi3DGenPipeline(Pipeline):
         
         return output
 
+    @torch.no_grad()
+    def preprocess_images(self, inputs: List[Image.Image], resolution: int = 518) -> torch.Tensor:
+        """
+        Batched, tensor-native version of `preprocess_image`.
+
+        BiRefNet runs once on all images without a usable alpha channel. Mask thresholding,
+        bounding box crop, padding, resizing and alpha premultiplication run on the device,
+        and the result skips the PIL round trip.
+
+        Returns:
+            torch.Tensor: [B, 3, resolution, resolution] premultiplied RGB in [0, 1], ready for `encode_image`.
+        """
+        rgbs, alphas = [], []
+        for input in inputs:
+            array = np.array(input.convert('RGBA') if input.mode == 'RGBA' else input.convert('RGB'))
+            has_alpha = array.shape[-1] == 4 and not np.all(array[:, :, 3] == 255)
+            image = torch.from_numpy(array).to(self.device).permute(2, 0, 1).float() / 255
+            rgbs.append(image[:3])
+            alphas.append(image[3] if has_alpha else None)
+
+        need_mask = [i for i, alpha in enumerate(alphas) if alpha is None]
+        if len(need_mask) > 0:
+            masks = self._get_birefnet_masks([rgbs[i] for i in need_mask])
+            for i, mask in zip(need_mask, masks):
+                alphas[i] = mask
+
+        # Bounding boxes of the foreground, fetched for all images at once
+        boxes = []
+        for alpha in alphas:
+            fg = alpha > 0.8
+            cols, rows = fg.any(dim=0).int(), fg.any(dim=1).int()
+            boxes.append(torch.stack([
+                cols.argmax(), rows.argmax(),
+                cols.shape[0] - 1 - cols.flip(0).argmax(), rows.shape[0] - 1 - rows.flip(0).argmax(),
+                fg.any(),
+            ]))
+        boxes = torch.stack(boxes).tolist()
+
+        outputs = []
+        for rgb, alpha, (x0, y0, x1, y1, found) in zip(rgbs, alphas, boxes):
+            if not found:  # Handle case where no foreground is detected
+                outputs.append(F.interpolate(rgb[None], (resolution, resolution), mode='bicubic', antialias=True)[0].clamp(0, 1))
+                continue
+            H, W = alpha.shape
+            center = (x0 + x1) / 2, (y0 + y1) / 2
+            size = int(max(x1 - x0, y1 - y0) * 1.2)
+            bbox = (
+                max(0, int(center[0] - size // 2)),
+                max(0, int(center[1] - size // 2)),
+                min(W, int(center[0] + size // 2)),
+                min(H, int(center[1] + size // 2)),
+            )
+            rgba = torch.cat([rgb, alpha[None]])[:, bbox[1]:bbox[3], bbox[0]:bbox[2]]
+
+            # Pad to a square to maintain aspect ratio
+            height, width = rgba.shape[1:]
+            if width > height:
+                padding = (width - height) // 2
+                rgba = F.pad(rgba, (0, 0, padding, width - height - padding))
+            else:
+                padding = (height - width) // 2
+                rgba = F.pad(rgba, (padding, height - width - padding, 0, 0))
+
+            rgba = F.interpolate(rgba[None], (resolution, resolution), mode='bicubic', antialias=True)[0].clamp(0, 1)
+            outputs.append(rgba[:3] * rgba[3:4])  # RGB channels premultiplied by alpha
+        return torch.stack(outputs)
+
     def _lazy_load_birefnet(self):
         """Lazy loading of the BiRefNet model"""
         from transformers import AutoImageProcessor, Mask2FormerForUniversalSegmentation, AutoModelForImageSegmentation
@@ -230,10 +467,29 @@ class Hi3DGenPipeline(Pipeline):
 
         return (mask_np > 128).astype(np.uint8)
 
+    def _get_birefnet_masks(self, images: List[torch.Tensor]) -> List[torch.Tensor]:
+        """Get object masks for [3, H, W] image tensors using one BiRefNet forward"""
+        if getattr(self, 'birefnet_model', None) is None:
+            self._lazy_load_birefnet()
+        image_size = (1024, 1024)
+        input_images = torch.cat([
+            F.interpolate(image[None], image_size, mode='bilinear', antialias=True)
+            for image in images
+        ])
+        input_images = transforms.functional.normalize(input_images, [0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+        dtype = next(self.birefnet_model.parameters()).dtype
+        preds = self.birefnet_model(input_images.to(dtype))[-1].sigmoid().float()
+        return [
+            (F.interpolate(pred[None], image.shape[1:], mode='bilinear')[0, 0] > 128 / 255).float()
+            for pred, image in zip(preds, images)
+        ]
+
     @torch.no_grad()
     def encode_image(self, image: Union[torch.Tensor, list[Image.Image]]) -> torch.Tensor:
         """
         Encode the image.
+        If `self.cond_cache` is set (a ConditioningCache), per-image results are cached in it,
+        keyed by image content.
 
         Args:
             image (Union[torch.Tensor, list[Image.Image]]): The image to encode
@@ -248,11 +504,27 @@ class Hi3DGenPipeline(Pipeline):
             image = [i.resize((518, 518), Image.LANCZOS) for i in image]
             image = [np.array(i.convert('RGB')).astype(np.float32) / 255 for i in image]
             image = [torch.from_numpy(i).permute(2, 0, 1).float() for i in image]
-            image = torch.stack(image).to(self.device)
+            image = torch.stack(image)
         else:
             raise ValueError(f"Unsupported type of image: {type(image)}")
-        
-        image = self.image_cond_model_transform(image).to(self.device)
+
+        cond_cache = getattr(self, 'cond_cache', None)
+        if cond_cache is None:
+            return self._encode_image_tensor(image)
+
+        # Only encode the images that are not cached yet, in one batch
+        keys = [cond_cache.key(i) for i in image]
+        patchtokens = [cond_cache.get(k, self.device) for k in keys]
+        missing = [i for i, p in enumerate(patchtokens) if p is None]
+        if len(missing) > 0:
+            encoded = self._encode_image_tensor(image[missing])
+            for i, p in zip(missing, encoded):
+                cond_cache.put(keys[i], p)
+                patchtokens[i] = p
+        return torch.stack(patchtokens)
+
+    def _encode_image_tensor(self, image: torch.Tensor) -> torch.Tensor:
+        image = self.image_cond_model_transform(image.to(self.device))
         features = self.models['image_cond_model'](image, is_training=True)['x_prenorm']
         patchtokens = F.layer_norm(features, features.shape[-1:])
         return patchtokens
@@ -279,6 +551,7 @@ class Hi3DGenPipeline(Pipeline):
         cond: dict,
         num_samples: int = 1,
         sampler_params: dict = {},
+        noise: Optional[torch.Tensor] = None,
     ) -> torch.Tensor:
         """
         Sample sparse structures with the given conditioning.
@@ -287,14 +560,17 @@ class Hi3DGenPipeline(Pipeline):
             cond (dict): The conditioning information.
             num_samples (int): The number of samples to generate.
             sampler_params (dict): Additional parameters for the sampler.
+            noise (torch.Tensor): The initial noise. Drawn from the global RNG if not given.
         """
         # Sample occupancy latent
         flow_model = self.models['sparse_structure_flow_model']
         reso = flow_model.resolution
-        noise = torch.randn(num_samples, flow_model.in_channels, reso, reso, reso).to(self.device)
-        sampler_params = {**self.sparse_structure_sampler_params, **sampler_params}
+        if noise is None:
+            noise = torch.randn(num_samples, flow_model.in_channels, reso, reso, reso)
+        noise = noise.to(self.device)
+        sampler_params = {'return_trajectory': False, **self.sparse_structure_sampler_params, **sampler_params}
         z_s = self.sparse_structure_sampler.sample(
-            flow_model,
+            self._compiled_sparse_structure_flow or flow_model,
             noise,
             **cond,
             **sampler_params,
@@ -332,6 +608,7 @@ class Hi3DGenPipeline(Pipeline):
         cond: dict,
         coords: torch.Tensor,
         sampler_params: dict = {},
+        noise: Optional[torch.Tensor] = None,
     ) -> sp.SparseTensor:
         """
         Sample structured latent with the given conditioning.
@@ -340,14 +617,18 @@ class Hi3DGenPipeline(Pipeline):
             cond (dict): The conditioning information.
             coords (torch.Tensor): The coordinates of the sparse structure.
             sampler_params (dict): Additional parameters for the sampler.
+            noise (torch.Tensor): The initial noise features, one row per coordinate.
+                Drawn from the global RNG if not given.
         """
         # Sample structured latent
         flow_model = self.models['slat_flow_model']
+        if noise is None:
+            noise = torch.randn(coords.shape[0], flow_model.in_channels)
         noise = sp.SparseTensor(
-            feats=torch.randn(coords.shape[0], flow_model.in_channels).to(self.device),
+            feats=noise.to(self.device),
             coords=coords,
         )
-        sampler_params = {**self.slat_sampler_params, **sampler_params}
+        sampler_params = {'return_trajectory': False, **self.slat_sampler_params, **sampler_params}
         slat = self.slat_sampler.sample(
             flow_model,
             noise,
@@ -384,13 +665,127 @@ class Hi3DGenPipeline(Pipeline):
             preprocess_image (bool): Whether to preprocess the image.
         """
         if preprocess_image:
-            image = self.preprocess_image(image)
-        cond = self.get_cond([image])
+            image = self.preprocess_images([image])
+        cond = self.get_cond(image if isinstance(image, torch.Tensor) else [image])
         torch.manual_seed(seed)
         coords = self.sample_sparse_structure(cond, num_samples, sparse_structure_sampler_params)
         slat = self.sample_slat(cond, coords, slat_sampler_params)
         return self.decode_slat(slat, formats)
 
+    @torch.no_grad()
+    def run_batch(
+        self,
+        images: List[Image.Image],
+        seeds: List[int],
+        sparse_structure_sampler_params: dict = {},
+        slat_sampler_params: dict = {},
+        formats: List[str] = ['mesh',],
+        preprocess_image: bool = True,
+    ) -> List[dict]:
+        """
+        Run the pipeline on independent image prompts as a single batch.
+
+        Every image gets its own seed and receives the same noise as `run` would draw for it,
+        so batching does not change the result of an individual prompt.
+
+        Args:
+            images (List[Image.Image]): The image prompts, one per job.
+            seeds (List[int]): The seed of each job.
+            sparse_structure_sampler_params (dict): Additional parameters for the sparse structure sampler.
+            slat_sampler_params (dict): Additional parameters for the structured latent sampler.
+            formats (List[str]): The formats to decode the structured latents to.
+            preprocess_image (bool): Whether to preprocess the images.
+
+        Returns:
+            List[dict]: One result per image, laid out like the output of `run`.
+        """
+        assert len(images) == len(seeds), f"Got {len(images)} images but {len(seeds)} seeds"
+        if preprocess_image:
+            images = self.preprocess_images(images)
+        cond = self.get_cond(images)
+        return self._run_seeds(cond, seeds, sparse_structure_sampler_params, slat_sampler_params, formats)
+
+    @torch.no_grad()
+    def run_variants(
+        self,
+        image: Image.Image,
+        seeds: List[int],
+        sparse_structure_sampler_params: dict = {},
+        slat_sampler_params: dict = {},
+        formats: List[str] = ['mesh',],
+        preprocess_image: bool = True,
+    ) -> List[dict]:
+        """
+        Generate one variant of a single image prompt per seed.
+
+        The image is preprocessed and encoded once. Both sampling stages then run once for
+        all seeds, so each variant matches `run` with that seed while only paying for the
+        conditioning once.
+
+        Args:
+            image (Image.Image): The image prompt.
+            seeds (List[int]): The seed of each variant.
+            sparse_structure_sampler_params (dict): Additional parameters for the sparse structure sampler.
+            slat_sampler_params (dict): Additional parameters for the structured latent sampler.
+            formats (List[str]): The formats to decode the structured latents to.
+            preprocess_image (bool): Whether to preprocess the image.
+
+        Returns:
+            List[dict]: One result per seed, laid out like the output of `run`.
+        """
+        if preprocess_image:
+            image = self.preprocess_images([image])
+        cond = self.get_cond(image if isinstance(image, torch.Tensor) else [image])
+        cond = {k: v.expand(len(seeds), *v.shape[1:]) for k, v in cond.items()}
+        return self._run_seeds(cond, seeds, sparse_structure_sampler_params, slat_sampler_params, formats)
+
+    def _run_seeds(
+        self,
+        cond: dict,
+        seeds: List[int],
+        sparse_structure_sampler_params: dict,
+        slat_sampler_params: dict,
+        formats: List[str],
+    ) -> List[dict]:
+        """
+        Sample one asset per row of the batched conditioning, each with its own seed.
+        """
+        generators = [torch.Generator().manual_seed(seed) for seed in seeds]
+
+        # Sparse structures for all jobs in one sampler run
+        flow_model = self.models['sparse_structure_flow_model']
+        reso = flow_model.resolution
+        noise = torch.cat([
+            torch.randn(1, flow_model.in_channels, reso, reso, reso, generator=g)
+            for g in generators
+        ])
+        coords = self.sample_sparse_structure(cond, len(seeds), sparse_structure_sampler_params, noise=noise)
+
+        # Jobs without any occupied voxel cannot enter the structured latent stage
+        counts = torch.bincount(coords[:, 0], minlength=len(seeds)).tolist()
+        keep = [i for i, n in enumerate(counts) if n > 0]
+        results = [{fmt: [] for fmt in formats} for _ in seeds]
+        if len(keep) == 0:
+            return results
+        if len(keep) < len(seeds):
+            remap = torch.full((len(seeds),), -1, dtype=coords.dtype, device=coords.device)
+            remap[keep] = torch.arange(len(keep), dtype=coords.dtype, device=coords.device)
+            coords = coords[remap[coords[:, 0].long()] >= 0]
+            coords[:, 0] = remap[coords[:, 0].long()]
+            cond = {k: v[keep] for k, v in cond.items()}
+
+        # Structured latents for all remaining jobs as one multi-batch sparse tensor
+        slat_flow_model = self.models['slat_flow_model']
+        noise = torch.cat([
+            torch.randn(counts[i], slat_flow_model.in_channels, generator=generators[i])
+            for i in keep
+        ])
+        slat = self.sample_slat(cond, coords, slat_sampler_params, noise=noise)
+        decoded = self.decode_slat(slat, formats)
+        for j, i in enumerate(keep):
+            results[i] = {fmt: [decoded[fmt][j]] for fmt in decoded}
+        return results
+
     @contextmanager
     def inject_sampler_multi_image(
         self,
@@ -410,31 +805,52 @@ class Hi3DGenPipeline(Pipeline):
         sampler = getattr(self, sampler_name)
         setattr(sampler, f'_old_inference_model', sampler._inference_model)
 
+        def _cond_slices(cond, kv_cache=None):
+            # Reuse the same per-image slices across steps so cached cross-attention K/V hit.
+            slices = lambda: [cond[i:i+1] for i in range(len(cond))]
+            return kv_cache.memo('cond_slices', [cond], slices) if kv_cache is not None else slices()
+
         if mode == 'stochastic':
             if num_images > num_steps:
                 print(f"\033[93mWarning: number of conditioning images is greater than number of steps for {sampler_name}. "
                     "This may lead to performance degradation.\033[0m")
 
-            cond_indices = (np.arange(num_steps) % num_images).tolist()
+            # Cycle through the images per model evaluation; multi-evaluation solvers call this more than once per step.
+            cond_counter = itertools.count()
             def _new_inference_model(self, model, x_t, t, cond, **kwargs):
-                cond_idx = cond_indices.pop(0)
-                cond_i = cond[cond_idx:cond_idx+1]
+                cond_idx = next(cond_counter) % num_images
+                cond_i = _cond_slices(cond, kwargs.get('kv_cache'))[cond_idx]
                 return self._old_inference_model(model, x_t, t, cond=cond_i, **kwargs)
         
         elif mode =='multidiffusion':
             from .samplers import FlowEulerSampler
-            def _new_inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, cfg_interval, **kwargs):
+            from .samplers.classifier_free_guidance_mixin import batched_inference
+            def _new_inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, cfg_interval, batch_cfg=False, **kwargs):
+                conds = _cond_slices(cond, kwargs.get('kv_cache'))
                 if cfg_interval[0] <= t <= cfg_interval[1]:
-                    preds = []
-                    for i in range(len(cond)):
-                        preds.append(FlowEulerSampler._inference_model(self, model, x_t, t, cond[i:i+1], **kwargs))
+                    if batch_cfg:
+                        preds = batched_inference(
+                            FlowEulerSampler._inference_model.__get__(self), model, x_t, t,
+                            conds + [neg_cond], **kwargs
+                        )
+                        neg_pred = preds.pop()
+                    else:
+                        preds = []
+                        for cond_i in conds:
+                            preds.append(FlowEulerSampler._inference_model(self, model, x_t, t, cond_i, **kwargs))
+                        neg_pred = FlowEulerSampler._inference_model(self, model, x_t, t, neg_cond, **kwargs)
                     pred = sum(preds) / len(preds)
-                    neg_pred = FlowEulerSampler._inference_model(self, model, x_t, t, neg_cond, **kwargs)
                     return (1 + cfg_strength) * pred - cfg_strength * neg_pred
                 else:
-                    preds = []
-                    for i in range(len(cond)):
-                        preds.append(FlowEulerSampler._inference_model(self, model, x_t, t, cond[i:i+1], **kwargs))
+                    if batch_cfg:
+                        preds = batched_inference(
+                            FlowEulerSampler._inference_model.__get__(self), model, x_t, t,
+                            conds, **kwargs
+                        )
+                    else:
+                        preds = []
+                        for cond_i in conds:
+                            preds.append(FlowEulerSampler._inference_model(self, model, x_t, t, cond_i, **kwargs))
                     pred = sum(preds) / len(preds)
                     return pred
             
@@ -471,7 +887,7 @@ class Hi3DGenPipeline(Pipeline):
             preprocess_image (bool): Whether to preprocess the image.
         """
         if preprocess_image:
-            images = [self.preprocess_image(image) for image in images]
+            images = self.preprocess_images(images)
         cond = self.get_cond(images)
         cond['neg_cond'] = cond['neg_cond'][:1]
         torch.manual_seed(seed)
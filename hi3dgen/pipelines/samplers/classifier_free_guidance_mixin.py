@@ -23,14 +23,70 @@
 # Copyright (c) [2025] [Microsoft]
 # SPDX-License-Identifier: MIT
 from typing import *
+import torch
+from ...modules import sparse as sp
+
+
+def batched_inference(inference_model, model, x_t, t, conds: List[torch.Tensor], **kwargs) -> list:
+    """
+    Evaluate the model under several conditions with a single batched forward.
+
+    x_t is repeated once per condition along the batch dimension (dense tensors are
+    concatenated, sparse tensors get their batch indices shifted), and the prediction
+    is split back into one entry per condition.
+
+    Args:
+        inference_model: The single-condition inference function to call.
+        model: The model to sample from.
+        x_t: The [N x C x ...] tensor or [N x * x C] sparse tensor of noisy inputs.
+        t: The current timestep.
+        conds: The conditions, each with batch size N or 1.
+
+    Returns:
+        A list with one prediction per condition.
+    """
+    K = len(conds)
+    N = x_t.shape[0]
+    def concat():
+        return torch.cat([c.expand(N, *c.shape[1:]) if c.shape[0] != N else c for c in conds], dim=0)
+    kv_cache = kwargs.get('kv_cache')
+    cond = kv_cache.memo(('batched_cond', N), conds, concat) if kv_cache is not None else concat()
+
+    if isinstance(x_t, sp.SparseTensor):
+        T = x_t.feats.shape[0]
+        feats = x_t.feats.repeat(K, *[1] * (x_t.feats.dim() - 1))
+        # The batched structure is cached on x_t so its index maps survive across steps.
+        template = x_t.get_spatial_cache(f'cfg_batch_{K}')
+        if template is None:
+            coords = x_t.coords.repeat(K, 1)
+            coords[:, 0] += torch.arange(K, device=coords.device, dtype=coords.dtype).repeat_interleave(T) * N
+            template = sp.SparseTensor(
+                feats=feats,
+                coords=coords,
+                shape=torch.Size([K * N, *x_t.shape[1:]]),
+                layout=[slice(s.start + k * T, s.stop + k * T) for k in range(K) for s in x_t.layout],
+            )
+            x_t.register_spatial_cache(f'cfg_batch_{K}', template)
+        x_batched = template.replace(feats)
+        pred = inference_model(model, x_batched, t, cond, **kwargs)
+        return [x_t.replace(f) for f in pred.feats.split(T, dim=0)]
+    else:
+        x_batched = x_t.repeat(K, *[1] * (x_t.dim() - 1))
+        pred = inference_model(model, x_batched, t, cond, **kwargs)
+        return list(pred.split(N, dim=0))
 
 
 class ClassifierFreeGuidanceSamplerMixin:
     """
     A mixin class for samplers that apply classifier-free guidance.
+
+    With `batch_cfg=True` the conditional and unconditional passes share one batched forward.
     """
 
-    def _inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, **kwargs):
-        pred = super()._inference_model(model, x_t, t, cond, **kwargs)
-        neg_pred = super()._inference_model(model, x_t, t, neg_cond, **kwargs)
+    def _inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, batch_cfg=False, **kwargs):
+        if batch_cfg:
+            pred, neg_pred = batched_inference(super()._inference_model, model, x_t, t, [cond, neg_cond], **kwargs)
+        else:
+            pred = super()._inference_model(model, x_t, t, cond, **kwargs)
+            neg_pred = super()._inference_model(model, x_t, t, neg_cond, **kwargs)
         return (1 + cfg_strength) * pred - cfg_strength * neg_pred
@@ -26,6 +26,8 @@ from typing import *
 import torch
 import numpy as np
 from tqdm import tqdm
+from ...modules import sparse as sp
+from ...modules.kv_cache import CrossAttentionKVCache
 from .base import Sampler
 from .classifier_free_guidance_mixin import ClassifierFreeGuidanceSamplerMixin
 from .guidance_interval_mixin import GuidanceIntervalSamplerMixin
@@ -35,14 +37,33 @@ class FlowEulerSampler(Sampler):
     """
     Generate samples from a flow-matching model using Euler sampling.
 
+    Other ODE solvers can be selected with `solver`:
+    - 'euler': first-order Euler, one model evaluation per step.
+    - 'heun': second-order Heun (RK2), two evaluations per step (one on the last step).
+    - 'dpm_solver++': second-order multistep DPM-Solver++(2M), one evaluation per step.
+    - 'adaptive': embedded Heun-Euler pair with step size control; `steps` sets the initial step size.
+
     Args:
         sigma_min: The minimum scale of noise in flow.
+        solver: The default ODE solver.
+        atol: The absolute error tolerance of the adaptive solver.
+        rtol: The relative error tolerance of the adaptive solver.
     """
+    SOLVERS = ('euler', 'heun', 'dpm_solver++', 'adaptive')
+
     def __init__(
         self,
         sigma_min: float,
+        solver: Literal['euler', 'heun', 'dpm_solver++', 'adaptive'] = 'euler',
+        atol: float = 5e-2,
+        rtol: float = 5e-2,
     ):
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unsupported solver: {solver}")
         self.sigma_min = sigma_min
+        self.solver = solver
+        self.atol = atol
+        self.rtol = rtol
 
     def _eps_to_xstart(self, x_t, t, eps):
         assert x_t.shape == eps.shape
@@ -97,6 +118,126 @@ class FlowEulerSampler(Sampler):
         pred_x_prev = x_t - (t - t_prev) * pred_v
         return {"pred_x_prev": pred_x_prev, "pred_x_0": pred_x_0}
 
+    @torch.no_grad()
+    def sample_once_heun(
+        self,
+        model,
+        x_t,
+        t: float,
+        t_prev: float,
+        cond: Optional[Any] = None,
+        **kwargs
+    ):
+        """
+        Sample x_{t-1} from the model using Heun's method.
+
+        The Euler step is corrected with the velocity at its end point, except on the
+        last step (t_prev == 0) where the correction is skipped.
+
+        Returns:
+            a dict containing the following
+            - 'pred_x_prev': x_{t-1}.
+            - 'pred_x_0': a prediction of x_0.
+        """
+        pred_x_0, pred_eps, pred_v = self._get_model_prediction(model, x_t, t, cond, **kwargs)
+        pred_x_prev = x_t - (t - t_prev) * pred_v
+        if t_prev > 0:
+            _, _, pred_v_prev = self._get_model_prediction(model, pred_x_prev, t_prev, cond, **kwargs)
+            pred_x_prev = x_t - (t - t_prev) * 0.5 * (pred_v + pred_v_prev)
+        return {"pred_x_prev": pred_x_prev, "pred_x_0": pred_x_0}
+
+    def _log_snr(self, t):
+        # lambda(t) = log(alpha_t / sigma_t) with alpha_t = 1 - t; -inf at t = 1.
+        with np.errstate(divide='ignore'):
+            return np.log(1 - t) - np.log(self.sigma_min + (1 - self.sigma_min) * t)
+
+    @torch.no_grad()
+    def sample_once_dpm_solver(
+        self,
+        model,
+        x_t,
+        t: float,
+        t_prev: float,
+        cond: Optional[Any] = None,
+        prev: Optional[Tuple[float, Any]] = None,
+        **kwargs
+    ):
+        """
+        Sample x_{t-1} from the model using DPM-Solver++(2M).
+
+        Args:
+            prev: (t, pred_x_0) of the previous step. If given, the second-order
+                multistep update is used, otherwise the first-order one.
+
+        Returns:
+            a dict containing the following
+            - 'pred_x_prev': x_{t-1}.
+            - 'pred_x_0': a prediction of x_0.
+        """
+        pred_x_0, pred_eps, pred_v = self._get_model_prediction(model, x_t, t, cond, **kwargs)
+        sigma_t = self.sigma_min + (1 - self.sigma_min) * t
+        sigma_s = self.sigma_min + (1 - self.sigma_min) * t_prev
+        alpha_s = 1 - t_prev
+        h = self._log_snr(t_prev) - self._log_snr(t)
+        d = pred_x_0
+        if prev is not None:
+            h_last = self._log_snr(t) - self._log_snr(prev[0])
+            if np.isfinite(h_last):
+                r = h_last / h
+                d = (1 + 0.5 / r) * pred_x_0 - (0.5 / r) * prev[1]
+        pred_x_prev = float(sigma_s / sigma_t) * x_t - float(alpha_s * np.expm1(-h)) * d
+        return {"pred_x_prev": pred_x_prev, "pred_x_0": pred_x_0}
+
+    @staticmethod
+    def _error_norm(x_low, x_high, x, atol, rtol):
+        feats = lambda a: a.feats if isinstance(a, sp.SparseTensor) else a
+        scale = atol + rtol * torch.maximum(feats(x).abs(), feats(x_high).abs())
+        return ((feats(x_high) - feats(x_low)) / scale).float().pow(2).mean().sqrt().item()
+
+    @torch.no_grad()
+    def _sample_adaptive(
+        self,
+        model,
+        x,
+        cond,
+        steps: int,
+        rescale_t: float,
+        atol: float,
+        rtol: float,
+        on_step: Callable[[int, float, dict], None],
+        verbose: bool,
+        **kwargs
+    ):
+        """
+        Integrate the flow with an embedded Heun-Euler pair and error-controlled step sizes.
+
+        Step sizes are controlled in the unrescaled time u, so `rescale_t` still shapes
+        the schedule. Rejected steps reuse the velocity at the start of the step.
+        """
+        rescale = lambda u: rescale_t * u / (1 + (rescale_t - 1) * u)
+        u, h = 1.0, 1.0 / steps
+        min_h = h / 64
+        step = 0
+        pred_x_0, _, pred_v = self._get_model_prediction(model, x, rescale(u), cond, **kwargs)
+        with tqdm(desc="Sampling", disable=not verbose) as pbar:
+            while u > 0:
+                h = min(h, u)
+                u_prev = max(u - h, 0.0)
+                t, t_prev = rescale(u), rescale(u_prev)
+                x_euler = x - (t - t_prev) * pred_v
+                _, _, pred_v_prev = self._get_model_prediction(model, x_euler, t_prev, cond, **kwargs)
+                x_heun = x - (t - t_prev) * 0.5 * (pred_v + pred_v_prev)
+                err = self._error_norm(x_euler, x_heun, x, atol, rtol)
+                if err <= 1 or h <= min_h:
+                    on_step(step, t, {"pred_x_prev": x_heun, "pred_x_0": pred_x_0})
+                    x, u = x_heun, u_prev
+                    step += 1
+                    pbar.update(1)
+                    if u > 0:
+                        pred_x_0, _, pred_v = self._get_model_prediction(model, x, t_prev, cond, **kwargs)
+                h = max(h * min(max(0.9 * max(err, 1e-8) ** -0.5, 0.2), 5.0), min_h)
+        return x
+
     @torch.no_grad()
     def sample(
         self,
@@ -106,6 +247,12 @@ class FlowEulerSampler(Sampler):
         steps: int = 50,
         rescale_t: float = 1.0,
         verbose: bool = True,
+        solver: Optional[str] = None,
+        atol: Optional[float] = None,
+        rtol: Optional[float] = None,
+        cache_cross_attn: bool = True,
+        return_trajectory: bool = True,
+        callback: Optional[Callable[[int, float, Any], None]] = None,
         **kwargs
     ):
         """
@@ -118,24 +265,67 @@ class FlowEulerSampler(Sampler):
             steps: The number of steps to sample.
             rescale_t: The rescale factor for t.
             verbose: If True, show a progress bar.
+            solver: The ODE solver, overriding the sampler's default.
+            atol: The absolute tolerance of the adaptive solver, overriding the sampler's default.
+            rtol: The relative tolerance of the adaptive solver, overriding the sampler's default.
+            cache_cross_attn: If True, compute the cross-attention keys/values of the
+                conditioning once and reuse them for every step of this run.
+            return_trajectory: If True, keep the predictions of every step in the output.
+                Turn off to keep memory constant in the number of steps.
+            callback: Optional function called as callback(step, t, pred_x_0) after every step,
+                e.g. to stream previews.
             **kwargs: Additional arguments for model_inference.
 
         Returns:
             a dict containing the following
             - 'samples': the model samples.
-            - 'pred_x_t': a list of prediction of x_t.
-            - 'pred_x_0': a list of prediction of x_0.
+            - 'pred_x_t': a list of prediction of x_t (only if return_trajectory).
+            - 'pred_x_0': a list of prediction of x_0 (only if return_trajectory).
         """
+        solver = solver if solver is not None else self.solver
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unsupported solver: {solver}")
         sample = noise
         t_seq = np.linspace(1, 0, steps + 1)
         t_seq = rescale_t * t_seq / (1 + (rescale_t - 1) * t_seq)
         t_pairs = list((t_seq[i], t_seq[i + 1]) for i in range(steps))
-        ret = {"samples": None, "pred_x_t": [], "pred_x_0": []}
-        for t, t_prev in tqdm(t_pairs, desc="Sampling", disable=not verbose):
-            out = self.sample_once(model, sample, t, t_prev, cond, **kwargs)
-            sample = out["pred_x_prev"]
-            ret["pred_x_t"].append(out["pred_x_prev"])
-            ret["pred_x_0"].append(out["pred_x_0"])
+        ret = {"samples": None, "pred_x_t": [], "pred_x_0": []} if return_trajectory else {"samples": None}
+
+        def on_step(step, t, out):
+            if return_trajectory:
+                ret["pred_x_t"].append(out["pred_x_prev"])
+                ret["pred_x_0"].append(out["pred_x_0"])
+            if callback is not None:
+                callback(step, t, out["pred_x_0"])
+
+        kv_cache = CrossAttentionKVCache() if cache_cross_attn else None
+        if kv_cache is not None:
+            kwargs['kv_cache'] = kv_cache
+        try:
+            if solver == 'adaptive':
+                sample = self._sample_adaptive(
+                    model, sample, cond, steps, rescale_t,
+                    atol if atol is not None else self.atol,
+                    rtol if rtol is not None else self.rtol,
+                    on_step, verbose, **kwargs
+                )
+            else:
+                prev = None
+                for step, (t, t_prev) in enumerate(tqdm(t_pairs, desc="Sampling", disable=not verbose)):
+                    if solver == 'heun':
+                        out = self.sample_once_heun(model, sample, t, t_prev, cond, **kwargs)
+                    elif solver == 'dpm_solver++':
+                        # First-order final step is more stable for short schedules.
+                        lower_order = step == steps - 1 and steps < 15
+                        out = self.sample_once_dpm_solver(model, sample, t, t_prev, cond, prev=None if lower_order else prev, **kwargs)
+                        prev = (t, out["pred_x_0"])
+                    else:
+                        out = self.sample_once(model, sample, t, t_prev, cond, **kwargs)
+                    sample = out["pred_x_prev"]
+                    on_step(step, t, out)
+        finally:
+            if kv_cache is not None:
+                kv_cache.clear()
         ret["samples"] = sample
         return ret
 
@@ -155,6 +345,7 @@ class FlowEulerCfgSampler(ClassifierFreeGuidanceSamplerMixin, FlowEulerSampler):
         rescale_t: float = 1.0,
         cfg_strength: float = 3.0,
         verbose: bool = True,
+        batch_cfg: bool = False,
         **kwargs
     ):
         """
@@ -169,15 +360,16 @@ class FlowEulerCfgSampler(ClassifierFreeGuidanceSamplerMixin, FlowEulerSampler):
             rescale_t: The rescale factor for t.
             cfg_strength: The strength of classifier-free guidance.
             verbose: If True, show a progress bar.
+            batch_cfg: If True, run the conditional and unconditional passes as one batched forward.
             **kwargs: Additional arguments for model_inference.
 
         Returns:
             a dict containing the following
             - 'samples': the model samples.
-            - 'pred_x_t': a list of prediction of x_t.
-            - 'pred_x_0': a list of prediction of x_0.
+            - 'pred_x_t': a list of prediction of x_t (only if return_trajectory).
+            - 'pred_x_0': a list of prediction of x_0 (only if return_trajectory).
         """
-        return super().sample(model, noise, cond, steps, rescale_t, verbose, neg_cond=neg_cond, cfg_strength=cfg_strength, **kwargs)
+        return super().sample(model, noise, cond, steps, rescale_t, verbose=verbose, neg_cond=neg_cond, cfg_strength=cfg_strength, batch_cfg=batch_cfg, **kwargs)
 
 
 class FlowEulerGuidanceIntervalSampler(GuidanceIntervalSamplerMixin, FlowEulerSampler):
@@ -196,6 +388,7 @@ class FlowEulerGuidanceIntervalSampler(GuidanceIntervalSamplerMixin, FlowEulerSa
         cfg_strength: float = 3.0,
         cfg_interval: Tuple[float, float] = (0.0, 1.0),
         verbose: bool = True,
+        batch_cfg: bool = False,
         **kwargs
     ):
         """
@@ -211,12 +404,13 @@ class FlowEulerGuidanceIntervalSampler(GuidanceIntervalSamplerMixin, FlowEulerSa
             cfg_strength: The strength of classifier-free guidance.
             cfg_interval: The interval for classifier-free guidance.
             verbose: If True, show a progress bar.
+            batch_cfg: If True, run the conditional and unconditional passes as one batched forward.
             **kwargs: Additional arguments for model_inference.
 
         Returns:
             a dict containing the following
             - 'samples': the model samples.
-            - 'pred_x_t': a list of prediction of x_t.
-            - 'pred_x_0': a list of prediction of x_0.
+            - 'pred_x_t': a list of prediction of x_t (only if return_trajectory).
+            - 'pred_x_0': a list of prediction of x_0 (only if return_trajectory).
         """
-        return super().sample(model, noise, cond, steps, rescale_t, verbose, neg_cond=neg_cond, cfg_strength=cfg_strength, cfg_interval=cfg_interval, **kwargs)
+        return super().sample(model, noise, cond, steps, rescale_t, verbose=verbose, neg_cond=neg_cond, cfg_strength=cfg_strength, cfg_interval=cfg_interval, batch_cfg=batch_cfg, **kwargs)
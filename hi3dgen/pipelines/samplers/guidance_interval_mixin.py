@@ -23,17 +23,23 @@
 # Copyright (c) [2025] [Microsoft]
 # SPDX-License-Identifier: MIT
 from typing import *
+from .classifier_free_guidance_mixin import batched_inference
 
 
 class GuidanceIntervalSamplerMixin:
     """
     A mixin class for samplers that apply classifier-free guidance with interval.
+
+    With `batch_cfg=True` the conditional and unconditional passes share one batched forward.
     """
 
-    def _inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, cfg_interval, **kwargs):
+    def _inference_model(self, model, x_t, t, cond, neg_cond, cfg_strength, cfg_interval, batch_cfg=False, **kwargs):
         if cfg_interval[0] <= t <= cfg_interval[1]:
-            pred = super()._inference_model(model, x_t, t, cond, **kwargs)
-            neg_pred = super()._inference_model(model, x_t, t, neg_cond, **kwargs)
+            if batch_cfg:
+                pred, neg_pred = batched_inference(super()._inference_model, model, x_t, t, [cond, neg_cond], **kwargs)
+            else:
+                pred = super()._inference_model(model, x_t, t, cond, **kwargs)
+                neg_pred = super()._inference_model(model, x_t, t, neg_cond, **kwargs)
             return (1 + cfg_strength) * pred - cfg_strength * neg_pred
         else:
             return super()._inference_model(model, x_t, t, cond, **kwargs)
@@ -23,3 +23,4 @@
 # Copyright (c) [2025] [Microsoft]
 # SPDX-License-Identifier: MIT
 from .cube2mesh import SparseFeatures2Mesh, MeshExtractResult
+from .cleanup import clean_mesh
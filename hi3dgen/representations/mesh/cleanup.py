@@ -0,0 +1,113 @@
+# Copyright (c) [2025] [Microsoft]
+# SPDX-License-Identifier: MIT
+"""
+Fused mesh cleanup on torch tensors.
+
+Does what trimesh's processing, `remove_duplicate_faces`, `remove_degenerate_faces`,
+`remove_unreferenced_vertices`, `rezero` and `vertex_normals` do for an extracted mesh,
+in one pass on the mesh's device and without building `trimesh.Trimesh` objects.
+"""
+from typing import *
+import torch
+
+
+__all__ = [
+    'clean_mesh',
+]
+
+
+def _group_rows(rows: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Group equal rows of an integer matrix with stable column sorts, which is much faster
+    than `torch.unique(dim=0)` on the CPU.
+
+    Returns:
+        inverse: [N] group of every row, groups numbered in sorted row order.
+        first: [G] index of the first row of every group.
+    """
+    order = torch.arange(rows.shape[0], device=rows.device)
+    for col in reversed(range(rows.shape[1])):
+        order = order[torch.sort(rows[order, col], stable=True).indices]
+    sorted_rows = rows[order]
+    starts = torch.ones(rows.shape[0], dtype=torch.bool, device=rows.device)
+    starts[1:] = (sorted_rows[1:] != sorted_rows[:-1]).any(dim=1)
+    inverse = torch.empty_like(order)
+    inverse[order] = torch.cumsum(starts, dim=0) - 1
+    return inverse, order[starts]
+
+
+def clean_mesh(
+    vertices: torch.Tensor,
+    faces: torch.Tensor,
+    merge_tolerance: float = 1e-8,
+    rezero: bool = False,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Clean a triangle mesh for export.
+
+    1. Welds vertices closer than `merge_tolerance` (per coordinate, as trimesh's merge).
+    2. Drops degenerate faces (repeated vertices or height below `merge_tolerance`).
+    3. Drops duplicate faces (same vertex set), keeping the first one.
+    4. Drops unreferenced vertices, keeping the order of the others.
+    5. Optionally translates the mesh so its bounding box starts at the origin.
+    6. Recomputes area-weighted vertex normals.
+
+    Args:
+        vertices: [V, 3] vertex positions.
+        faces: [F, 3] triangle indices.
+        merge_tolerance: Distance under which vertices are welded and faces are degenerate.
+        rezero: Whether to move the minimum corner of the bounding box to the origin.
+
+    Returns:
+        vertices: [V', 3] float32 vertex positions.
+        faces: [F', 3] int64 triangle indices.
+        normals: [V', 3] float32 unit vertex normals.
+    """
+    vertices = vertices.detach().float()
+    faces = faces.detach().long()
+    if faces.shape[0] == 0 or vertices.shape[0] == 0:
+        return vertices.new_zeros(0, 3), faces.new_zeros(0, 3), vertices.new_zeros(0, 3)
+
+    # Weld: vertices on the same tolerance grid point become one
+    finite = torch.isfinite(vertices).all(dim=1)
+    keys = torch.round(vertices.double() / merge_tolerance).long()
+    keys[~finite] = torch.iinfo(torch.long).max
+    weld, first = _group_rows(keys)
+    positions, faces = vertices[first], weld[faces]
+
+    # Degenerate faces: repeated or non-finite vertices, or a height below the tolerance
+    v0, v1, v2 = positions[faces[:, 0]], positions[faces[:, 1]], positions[faces[:, 2]]
+    double_area = torch.linalg.norm(torch.cross(v1 - v0, v2 - v0, dim=-1), dim=-1)
+    longest_edge = torch.stack([
+        torch.linalg.norm(v1 - v0, dim=-1),
+        torch.linalg.norm(v2 - v1, dim=-1),
+        torch.linalg.norm(v0 - v2, dim=-1),
+    ], dim=-1).amax(dim=-1)
+    keep = (
+        (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+        & torch.isfinite(double_area)
+        & (double_area > merge_tolerance * longest_edge)
+    )
+    faces = faces[keep]
+
+    # Duplicate faces: same vertices in any order, the first occurrence is kept
+    _, first = _group_rows(faces.sort(dim=1).values)
+    faces = faces[first.sort().values]
+
+    # Compaction
+    referenced = torch.zeros(positions.shape[0], dtype=torch.bool, device=positions.device)
+    referenced[faces.reshape(-1)] = True
+    remap = torch.cumsum(referenced, dim=0) - 1
+    positions, faces = positions[referenced], remap[faces]
+
+    if rezero and positions.shape[0] > 0:
+        positions = positions - positions.amin(dim=0)
+
+    # Area-weighted vertex normals
+    v0, v1, v2 = positions[faces[:, 0]], positions[faces[:, 1]], positions[faces[:, 2]]
+    face_normals = torch.cross(v1 - v0, v2 - v0, dim=-1)
+    normals = torch.zeros_like(positions)
+    for k in range(3):
+        normals.index_add_(0, faces[:, k], face_normals)
+    normals = torch.nn.functional.normalize(normals, dim=1)
+    return positions, faces, normals
@@ -33,6 +33,8 @@
 import torch
 from ...modules.sparse import SparseTensor
 from .utils_cube import *
+from .marching_cubes import sparse_marching_cubes, dense_marching_cubes
+from .cleanup import clean_mesh
 import numpy as np
 import trimesh
 import numpy as np
@@ -114,9 +116,58 @@ class MeshExtractResult:
         
         return mesh
 
+    def to_arrays(self, transform_pose=False, rezero=False):
+        """
+        Cleaned mesh arrays ready for export (see `clean_mesh`), computed on the mesh's
+        device without building a trimesh.
+
+        Returns:
+            vertices: [V, 3] float32 numpy array.
+            faces: [F, 3] int64 numpy array.
+            normals: [V, 3] float32 numpy array.
+        """
+        vertices = self.vertices
+        if transform_pose:
+            transform_matrix = torch.tensor([
+                [1, 0, 0],
+                [0, 0, -1],
+                [0, 1, 0]
+            ], dtype=vertices.dtype, device=vertices.device)
+            vertices = vertices @ transform_matrix
+        vertices, faces, normals = clean_mesh(vertices, self.faces, rezero=rezero)
+        return vertices.cpu().numpy(), faces.cpu().numpy(), normals.cpu().numpy()
+
+def skimage_marching_cubes(scalar_field: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Lewiner marching cubes from skimage, on the CPU."""
+    scalar_np = scalar_field.cpu().numpy()
+    vertices, faces, normals, _ = measure.marching_cubes(
+        scalar_np,
+        level=0.0,
+        gradient_direction='ascent'
+    )
+    vertices = torch.from_numpy(np.ascontiguousarray(vertices)).float()
+    faces = torch.from_numpy(np.ascontiguousarray(faces)).long()
+    return vertices, faces
+
+
+def torch_marching_cubes(scalar_field: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Table-driven marching cubes in torch, on the field's device. Same winding as skimage's 'ascent'."""
+    vertices, faces, _ = dense_marching_cubes(scalar_field)
+    return vertices, faces
+
+
+MarchingCubesBackends = {
+    'skimage': skimage_marching_cubes,
+    'torch': torch_marching_cubes,
+}
+
+
 class EnhancedMarchingCubes:
-    def __init__(self, device="cuda"):
+    def __init__(self, device="cuda", backend="skimage"):
+        if backend not in MarchingCubesBackends:
+            raise ValueError(f"Unsupported marching cubes backend: {backend}")
         self.device = device
+        self.backend = backend
 
     def __call__(self,
                  voxelgrid_vertices: torch.Tensor,
@@ -133,39 +184,33 @@ class EnhancedMarchingCubes:
         elif scalar_field.dim() > 3:
             scalar_field = scalar_field.squeeze()
 
-        # Convert to numpy and ensure values are in correct range
-        scalar_np = scalar_field.cpu().numpy()
+        if scalar_field.dim() != 3:
+            raise ValueError(f"Expected 3D array, got shape {tuple(scalar_field.shape)}")
 
-        if scalar_np.ndim != 3:
-            raise ValueError(f"Expected 3D array, got shape {scalar_np.shape}")
+        # Run marching cubes in grid index coordinates
+        vertices, faces = MarchingCubesBackends[self.backend](scalar_field)
 
-        # Run marching cubes with normalized coordinates
-        vertices, faces, normals, _ = measure.marching_cubes(
-            scalar_np,
-            level=0.0,
-            gradient_direction='ascent'
-        )
+        vertices = vertices.to(self.device)
+        faces = faces.to(self.device)
 
-        vertices = torch.from_numpy(np.ascontiguousarray(vertices)).float().to(self.device)
-        faces = torch.from_numpy(np.ascontiguousarray(faces)).long().to(self.device)
+        # Deformed positions and colors are interpolated together in one pass
+        grid_shape = tuple(scalar_field.shape)
+        attrs = []
+        if voxelgrid_vertices is not None:
+            attrs.append(voxelgrid_vertices.reshape(*grid_shape, 3))
+        if voxelgrid_colors is not None:
+            attrs.append(voxelgrid_colors.reshape(*grid_shape, -1).to(attrs[0].dtype if attrs else voxelgrid_colors.dtype))
+        interpolated = self._trilinear_interpolate(vertices, torch.cat(attrs, dim=-1)) if attrs else None
 
-        # Apply deformations
+        deformed_vertices = vertices
         if voxelgrid_vertices is not None:
-            # Reshape and normalize voxelgrid_vertices if needed
-            if voxelgrid_vertices.dim() == 2:
-                voxelgrid_vertices = voxelgrid_vertices.reshape(grid_size, grid_size, grid_size, 3)
-            deformed_vertices = self._apply_deformations(vertices, voxelgrid_vertices)
-        else:
-            deformed_vertices = vertices
+            deformed_vertices, interpolated = interpolated[:, :3], interpolated[:, 3:]
 
         # Handle colors if provided
         colors = None
         if voxelgrid_colors is not None:
-            if voxelgrid_colors.dim() == 2:
-                voxelgrid_colors = voxelgrid_colors.reshape(grid_size, grid_size, grid_size, -1)
-            colors = self._interpolate_colors(vertices, voxelgrid_colors)
             # Ensure colors are in [0, 1] range
-            colors = torch.sigmoid(colors)
+            colors = torch.sigmoid(interpolated)
 
         # Compute deviation loss for training
         deviation_loss = torch.tensor(0.0, device=self.device)
@@ -176,127 +221,29 @@ class EnhancedMarchingCubes:
 
         return deformed_vertices, faces, deviation_loss, colors
 
-    def _apply_deformations(self, vertices: torch.Tensor,
-                            voxelgrid_vertices: torch.Tensor) -> torch.Tensor:
-        """Apply deformations to vertices using trilinear interpolation"""
-
-        grid_positions = vertices.clone()
-
-        # Scale to grid coordinates
-        grid_coords = grid_positions.long()
-        local_coords = grid_positions - grid_coords.float()
-
-        # Reshape voxelgrid_vertices if needed
-        if voxelgrid_vertices.dim() == 2:
-            # Assuming voxelgrid_vertices is [N, 3]
-            grid_size = int(round(voxelgrid_vertices.shape[0] ** (1 / 3)))
-            voxelgrid_vertices = voxelgrid_vertices.reshape(grid_size, grid_size, grid_size, 3)
-
-        # Ensure coordinates are within bounds
-        grid_coords = torch.clamp(grid_coords, 0, voxelgrid_vertices.shape[0] - 1)
-
-        # Perform trilinear interpolation
-        deformed_vertices = self._trilinear_interpolate(
-            grid_coords, local_coords, voxelgrid_vertices
-        )
-
-        return deformed_vertices
-
-    def _interpolate_colors(self, vertices: torch.Tensor,
-                            voxelgrid_colors: torch.Tensor) -> torch.Tensor:
-        """Interpolate colors for vertices"""
-
-        # Get grid positions
-        grid_positions = vertices.clone()
-
-        # Scale to grid coordinates
-        grid_coords = grid_positions.long()
-        local_coords = grid_positions - grid_coords.float()
-
-        # Reshape colors if they're in 2D format
-        if voxelgrid_colors.dim() == 2:
-            grid_size = int(round(voxelgrid_colors.shape[0] ** (1 / 3)))
-            color_channels = voxelgrid_colors.shape[1]
-            voxelgrid_colors = voxelgrid_colors.reshape(grid_size, grid_size, grid_size, color_channels)
-
-        # Ensure coordinates are within bounds
-        grid_coords = torch.clamp(grid_coords, 0, voxelgrid_colors.shape[0] - 1)
-
-        # Perform trilinear interpolation
-        return self._trilinear_interpolate(
-            grid_coords, local_coords, voxelgrid_colors, is_color=True
-        )
+    def _trilinear_interpolate(self, positions: torch.Tensor, values: torch.Tensor) -> torch.Tensor:
+        """
+        Trilinearly interpolate a [X, Y, Z, C] grid at [N, 3] grid-space positions.
 
-    def _trilinear_interpolate(self, grid_coords: torch.Tensor,
-                               local_coords: torch.Tensor,
-                               values: torch.Tensor,
-                               is_color: bool = False) -> torch.Tensor:
-        """Perform trilinear interpolation"""
-        x, y, z = local_coords[:, 0], local_coords[:, 1], local_coords[:, 2]
-
-        if is_color and values.dim() == 2:
-            # Handle flat color array
-            grid_size = int(round(values.shape[0] ** (1 / 3)))
-            color_channels = values.shape[1]
-            values = values.reshape(grid_size, grid_size, grid_size, color_channels)
-
-        # Get corner values with proper indexing based on dimensionality
-        if values.dim() == 4:  # For 4D tensors (grid x grid x grid x channels)
-            c000 = values[grid_coords[:, 0], grid_coords[:, 1], grid_coords[:, 2], :]
-            c001 = values[grid_coords[:, 0], grid_coords[:, 1],
-                   torch.clamp(grid_coords[:, 2] + 1, 0, values.shape[2] - 1), :]
-            c010 = values[grid_coords[:, 0], torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1),
-                   grid_coords[:, 2], :]
-            c011 = values[grid_coords[:, 0], torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1),
-                   torch.clamp(grid_coords[:, 2] + 1, 0, values.shape[2] - 1), :]
-            c100 = values[torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), grid_coords[:, 1],
-                   grid_coords[:, 2], :]
-            c101 = values[torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), grid_coords[:, 1],
-                   torch.clamp(grid_coords[:, 2] + 1, 0, values.shape[2] - 1), :]
-            c110 = values[torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1),
-                   torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1), grid_coords[:, 2], :]
-            c111 = values[torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1),
-                   torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1),
-                   torch.clamp(grid_coords[:, 2] + 1, 0, values.shape[2] - 1), :]
-        else:
-            c000 = values[grid_coords[:, 0], grid_coords[:, 1], grid_coords[:, 2]]
-            c001 = values[
-                grid_coords[:, 0], grid_coords[:, 1], torch.clamp(grid_coords[:, 2] + 1, 0, values.shape[2] - 1)]
-            c010 = values[
-                grid_coords[:, 0], torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1), grid_coords[:, 2]]
-            c011 = values[grid_coords[:, 0], torch.clamp(grid_coords[:, 1] + 1, 0, values.shape[1] - 1), torch.clamp(
-                grid_coords[:, 2] + 1, 0, values.shape[2] - 1)]
-            c100 = values[
-                torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), grid_coords[:, 1], grid_coords[:, 2]]
-            c101 = values[torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), grid_coords[:, 1], torch.clamp(
-                grid_coords[:, 2] + 1, 0, values.shape[2] - 1)]
-            c110 = values[
-                torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), torch.clamp(grid_coords[:, 1] + 1, 0,
-                                                                                        values.shape[
-                                                                                            1] - 1), grid_coords[:, 2]]
-            c111 = values[
-                torch.clamp(grid_coords[:, 0] + 1, 0, values.shape[0] - 1), torch.clamp(grid_coords[:, 1] + 1, 0,
-                                                                                        values.shape[
-                                                                                            1] - 1), torch.clamp(
-                    grid_coords[:, 2] + 1, 0, values.shape[2] - 1)]
-
-        # Add channel dimension for 3D tensors if needed
-        if values.dim() == 3:
-            c000, c001, c010, c011 = [c[..., None] if c.dim() == 1 else c for c in [c000, c001, c010, c011]]
-            c100, c101, c110, c111 = [c[..., None] if c.dim() == 1 else c for c in [c100, c101, c110, c111]]
-
-        # Interpolate along x
-        c00 = c000 * (1 - x)[:, None] + c100 * x[:, None]
-        c01 = c001 * (1 - x)[:, None] + c101 * x[:, None]
-        c10 = c010 * (1 - x)[:, None] + c110 * x[:, None]
-        c11 = c011 * (1 - x)[:, None] + c111 * x[:, None]
-
-        # Interpolate along y
-        c0 = c00 * (1 - y)[:, None] + c10 * y[:, None]
-        c1 = c01 * (1 - y)[:, None] + c11 * y[:, None]
-
-        # Interpolate along z
-        return c0 * (1 - z)[:, None] + c1 * z[:, None]
+        The eight corner indices are computed once into the flattened grid and gathered
+        in a single lookup, for all channels at once. Corners beyond the grid are clamped
+        to its last cell.
+        """
+        X, Y, Z, C = values.shape
+        size = torch.tensor([X, Y, Z], device=positions.device)
+        grid_coords = positions.long()
+        local_coords = positions - grid_coords.float()
+        lo = torch.minimum(grid_coords.clamp(min=0), size - 1)
+        hi = torch.minimum(lo + 1, size - 1)
+
+        offsets = cube_corners.to(positions.device)  # [8, 3]
+        corners = torch.where(offsets.bool().unsqueeze(0), hi.unsqueeze(1), lo.unsqueeze(1))  # [N, 8, 3]
+        index = (corners[..., 0] * Y + corners[..., 1]) * Z + corners[..., 2]
+        local = local_coords.unsqueeze(1)
+        weights = torch.where(offsets.bool().unsqueeze(0), local, 1 - local).prod(dim=-1)  # [N, 8]
+
+        gathered = values.reshape(-1, C)[index.reshape(-1)].reshape(-1, 8, C)
+        return (gathered * weights.unsqueeze(-1).to(gathered.dtype)).sum(dim=1)
 
     def _compute_deviation_loss(self, original_vertices: torch.Tensor,
                                 deformed_vertices: torch.Tensor) -> torch.Tensor:
@@ -304,18 +251,42 @@ class EnhancedMarchingCubes:
         return torch.mean((deformed_vertices - original_vertices) ** 2)
 
 class SparseFeatures2Mesh:
-    def __init__(self, device="cuda", res=128, use_color=True):
+    def __init__(self, device="cuda", res=128, use_color=True, sparse_mc=True, mc_backend="skimage"):
+        """
+        Args:
+            sparse_mc: If True, run marching cubes only over the cubes around the sparse
+                vertices, on their device. Otherwise scatter them into a dense (res+1)^3
+                grid and extract with `EnhancedMarchingCubes`.
+            mc_backend: The `MarchingCubesBackends` entry used by the dense path.
+        """
         super().__init__()
         self.device = device
         self.res = res
-        self.mesh_extractor = EnhancedMarchingCubes(device=device)
+        self.mesh_extractor = EnhancedMarchingCubes(device=device, backend=mc_backend)
         self.sdf_bias = -1.0 / res
-        verts, cube = construct_dense_grid(self.res, self.device)
-        self.reg_c = cube.to(self.device)
-        self.reg_v = verts.to(self.device)
+        self._reg_c = None
+        self._reg_v = None
         self.use_color = use_color
+        self.sparse_mc = sparse_mc
         self._calc_layout()
 
+    def _construct_dense_grid(self):
+        verts, cube = construct_dense_grid(self.res, self.device)
+        self._reg_c = cube.to(self.device)
+        self._reg_v = verts.to(self.device)
+
+    @property
+    def reg_c(self):
+        if self._reg_c is None:
+            self._construct_dense_grid()
+        return self._reg_c
+
+    @property
+    def reg_v(self):
+        if self._reg_v is None:
+            self._construct_dense_grid()
+        return self._reg_v
+
     def _calc_layout(self):
         LAYOUTS = {
             'sdf': {'shape': (8, 1), 'size': 8},
@@ -340,6 +311,28 @@ class SparseFeatures2Mesh:
         return feats[:, self.layouts[name]['range'][0]:self.layouts[name]['range'][1]].reshape(-1, *self.layouts[name][
             'shape'])
 
+    def _sparse_extract(self, v_pos: torch.Tensor, v_attrs: torch.Tensor, training: bool = False):
+        """
+        Sparse counterpart of the dense grid + `EnhancedMarchingCubes` path, with the same outputs.
+
+        Vertices missing from `v_pos` behave like the dense grid's fill (sdf 1, no deformation,
+        zero color). Mesh vertices lie on grid edges, where the dense path's trilinear
+        interpolation reduces to a lerp of the two end points, so the deformation offsets and
+        colors are interpolated along the edges directly.
+        """
+        attrs = [torch.tanh(v_attrs[:, 1:4])]
+        if self.use_color:
+            attrs.append(v_attrs[:, 4:])
+        vertices, faces, attrs = sparse_marching_cubes(v_pos, v_attrs[:, 0], self.res, attrs=torch.cat(attrs, dim=-1))
+        deformed_vertices = vertices / self.res - 0.5 + (1 - 1e-8) / (self.res * 2) * attrs[:, :3]
+        colors = torch.sigmoid(attrs[:, 3:]) if self.use_color else None
+        deviation_loss = torch.tensor(0.0, device=vertices.device)
+        if training:
+            deviation_loss = torch.mean((deformed_vertices - vertices) ** 2)
+        # Same winding as EnhancedMarchingCubes, which flips skimage's 'ascent' faces.
+        faces = faces.flip(dims=[1])
+        return deformed_vertices, faces, deviation_loss, colors
+
     def __call__(self, cubefeats: SparseTensor, training=False):
         coords = cubefeats.coords[:, 1:]
         feats = cubefeats.feats
@@ -351,23 +344,26 @@ class SparseFeatures2Mesh:
         v_pos, v_attrs, reg_loss = sparse_cube2verts(coords, torch.cat(v_attrs, dim=-1),
                                                      training=training)
 
-        v_attrs_d = get_dense_attrs(v_pos, v_attrs, res=self.res + 1, sdf_init=True)
-
-        if self.use_color:
-            sdf_d, deform_d, colors_d = (v_attrs_d[..., 0], v_attrs_d[..., 1:4],
-                                         v_attrs_d[..., 4:])
+        if self.sparse_mc:
+            vertices, faces, L_dev, colors = self._sparse_extract(v_pos, v_attrs, training=training)
         else:
-            sdf_d, deform_d = v_attrs_d[..., 0], v_attrs_d[..., 1:4]
-            colors_d = None
-
-        x_nx3 = get_defomed_verts(self.reg_v, deform_d, self.res)
-
-        vertices, faces, L_dev, colors = self.mesh_extractor(
-            voxelgrid_vertices=x_nx3,
-            scalar_field=sdf_d,
-            voxelgrid_colors=colors_d,
-            training=training
-        )
+            v_attrs_d = get_dense_attrs(v_pos, v_attrs, res=self.res + 1, sdf_init=True)
+
+            if self.use_color:
+                sdf_d, deform_d, colors_d = (v_attrs_d[..., 0], v_attrs_d[..., 1:4],
+                                             v_attrs_d[..., 4:])
+            else:
+                sdf_d, deform_d = v_attrs_d[..., 0], v_attrs_d[..., 1:4]
+                colors_d = None
+
+            x_nx3 = get_defomed_verts(self.reg_v, deform_d, self.res)
+
+            vertices, faces, L_dev, colors = self.mesh_extractor(
+                voxelgrid_vertices=x_nx3,
+                scalar_field=sdf_d,
+                voxelgrid_colors=colors_d,
+                training=training
+            )
 
         mesh = MeshExtractResult(vertices=vertices, faces=faces,
                                  vertex_attrs=colors, res=self.res)
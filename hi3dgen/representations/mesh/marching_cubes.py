@@ -0,0 +1,219 @@
+# Copyright (c) [2025] [Microsoft]
+# SPDX-License-Identifier: MIT
+"""
+Table-driven marching cubes in PyTorch.
+
+The triangle table is generated at import time instead of being transcribed. On every
+cube face the iso-contour segments are built with a fixed rule for ambiguous faces
+(negative corners are always separated), so two cubes sharing a face always agree on
+its segments and the extracted surface is watertight. Segments are oriented with the
+face winding, chained into loops around the cube and fan triangulated.
+
+Grid vertices with a negative value are inside. Faces are wound like the output of
+`skimage.measure.marching_cubes(..., gradient_direction='ascent')`, the convention
+`EnhancedMarchingCubes` post-processes.
+"""
+from typing import *
+import torch
+
+
+__all__ = [
+    'sparse_marching_cubes',
+    'dense_marching_cubes',
+]
+
+
+# Corner i of a cube sits at (i & 1, (i >> 1) & 1, (i >> 2) & 1), as `cube_corners` in utils_cube.
+_CORNERS = [(i & 1, (i >> 1) & 1, (i >> 2) & 1) for i in range(8)]
+# Edges as (lower corner, upper corner, axis).
+_EDGES = [(c, c | (1 << a), a) for a in range(3) for c in range(8) if not c & (1 << a)]
+
+
+def _face_rings() -> List[List[int]]:
+    """Corners of every face, counter-clockwise seen from outside the cube."""
+    rings = []
+    for a in range(3):
+        u, v = (a + 1) % 3, (a + 2) % 3
+        for s in range(2):
+            ring = []
+            for pu, pv in [(0, 0), (1, 0), (1, 1), (0, 1)]:
+                p = [0, 0, 0]
+                p[a], p[u], p[v] = s, pu, pv
+                ring.append(p[0] | (p[1] << 1) | (p[2] << 2))
+            rings.append(ring if s == 1 else ring[::-1])
+    return rings
+
+
+def _build_tables() -> Tuple[torch.Tensor, torch.Tensor]:
+    edge_of = {frozenset((c0, c1)): i for i, (c0, c1, _) in enumerate(_EDGES)}
+    rings = _face_rings()
+    tables = []
+    for config in range(256):
+        inside = [bool(config & (1 << c)) for c in range(8)]
+        succ = {}
+        for ring in rings:
+            crossing = [i for i in range(4) if inside[ring[i]] != inside[ring[(i + 1) % 4]]]
+            for i in crossing:
+                if inside[ring[i]]:
+                    continue
+                # Pair each edge entering the inside with the next edge leaving it.
+                j = next(j for j in [(i + k) % 4 for k in range(1, 4)] if j in crossing and inside[ring[j]])
+                succ[edge_of[frozenset((ring[i], ring[(i + 1) % 4]))]] = edge_of[frozenset((ring[j], ring[(j + 1) % 4]))]
+        tris = []
+        while succ:
+            loop = [next(iter(succ))]
+            while succ[loop[-1]] != loop[0]:
+                loop.append(succ[loop[-1]])
+            for e in loop:
+                del succ[e]
+            tris.extend([loop[0], loop[k + 1], loop[k]] for k in range(1, len(loop) - 1))
+        tables.append(tris)
+    max_tris = max(len(t) for t in tables)
+    tri_table = torch.full((256, max_tris, 3), -1, dtype=torch.long)
+    for config, tris in enumerate(tables):
+        if tris:
+            tri_table[config, :len(tris)] = torch.tensor(tris, dtype=torch.long)
+    num_tris = torch.tensor([len(t) for t in tables], dtype=torch.long)
+    return tri_table, num_tris
+
+
+TRI_TABLE, NUM_TRIS = _build_tables()
+CORNER_OFFSETS = torch.tensor(_CORNERS, dtype=torch.long)
+EDGE_CORNERS = torch.tensor([[c0, c1] for c0, c1, _ in _EDGES], dtype=torch.long)
+EDGE_AXES = torch.tensor([a for _, _, a in _EDGES], dtype=torch.long)
+
+
+def _march(
+    cubes: torch.Tensor,
+    fetch: Callable[[torch.Tensor, bool], Tuple[torch.Tensor, Optional[torch.Tensor]]],
+    res_v: int,
+) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Run marching cubes over a set of candidate cubes.
+
+    Args:
+        cubes: [M, 3] integer coordinates of the lower corner of each cube.
+        fetch: Maps [K, 3] grid vertex coordinates to their values [K] and, if asked for,
+            their attributes [K, F] (or None).
+        res_v: Number of grid vertices along each axis, used to key vertices and edges.
+
+    Returns:
+        vertices: [V, 3] vertices in grid coordinates.
+        faces: [T, 3] triangle indices.
+        attrs: [V, F] attributes interpolated along the edges, or None.
+    """
+    device = cubes.device
+    corners = cubes.unsqueeze(1) + CORNER_OFFSETS.to(device).unsqueeze(0)
+    values, _ = fetch(corners.reshape(-1, 3), False)
+    inside = (values.reshape(-1, 8) < 0).long()
+    config = (inside << torch.arange(8, device=device)).sum(dim=1)
+    keep = NUM_TRIS.to(device)[config] > 0
+    cubes, config = cubes[keep], config[keep]
+
+    # Triangles as (cube, local edge) pairs, then each local edge as a global edge key.
+    tris = TRI_TABLE.to(device)[config]
+    valid = tris[..., 0] >= 0
+    cube_idx = torch.arange(cubes.shape[0], device=device).unsqueeze(1).expand_as(valid)[valid]
+    local_edges = tris[valid]
+    base = cubes[cube_idx].unsqueeze(1) + CORNER_OFFSETS.to(device)[EDGE_CORNERS.to(device)[local_edges, 0]]
+    base_key = (base[..., 0] * res_v + base[..., 1]) * res_v + base[..., 2]
+    edge_keys = base_key * 3 + EDGE_AXES.to(device)[local_edges]
+    edge_keys, faces = torch.unique(edge_keys.reshape(-1), return_inverse=True)
+    faces = faces.reshape(-1, 3)
+
+    # One vertex per crossed edge, interpolated between the edge end points.
+    axis = edge_keys % 3
+    base_key = edge_keys // 3
+    p0 = torch.stack([base_key // (res_v * res_v), (base_key // res_v) % res_v, base_key % res_v], dim=-1)
+    p1 = p0 + torch.eye(3, dtype=p0.dtype, device=device)[axis]
+    (v0, a0), (v1, a1) = fetch(p0, True), fetch(p1, True)
+    t = (v0 / (v0 - v1)).clamp(0, 1).unsqueeze(-1)
+    vertices = p0.float() + t * (p1 - p0).float()
+    attrs = None if a0 is None else torch.lerp(a0, a1, t.to(a0.dtype))
+    return vertices, faces, attrs
+
+
+def sparse_marching_cubes(
+    coords: torch.Tensor,
+    values: torch.Tensor,
+    res: int,
+    attrs: Optional[torch.Tensor] = None,
+    outside_value: float = 1.0,
+) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Marching cubes over a sparse set of grid vertices.
+
+    Grid vertices that are not listed take `outside_value` and zero attributes, as if the
+    vertices were scattered into a dense grid first, but only cubes touching an inside
+    vertex are visited, so memory scales with the surface instead of the grid volume.
+
+    Args:
+        coords: [N, 3] integer coordinates of the listed grid vertices, in [0, res].
+        values: [N] values at the listed vertices; negative is inside.
+        res: Number of cubes along each axis.
+        attrs: [N, F] optional per-vertex attributes to interpolate onto the surface.
+        outside_value: Value of the vertices that are not listed.
+
+    Returns:
+        vertices: [V, 3] vertices in grid coordinates.
+        faces: [T, 3] triangle indices.
+        attrs: [V, F] interpolated attributes, or None.
+    """
+    res_v = res + 1
+    coords = coords.long()
+    keys = (coords[:, 0] * res_v + coords[:, 1]) * res_v + coords[:, 2]
+    keys, order = torch.sort(keys)
+    coords, values = coords[order], values[order]
+    attrs = attrs[order] if attrs is not None else None
+
+    def fetch(points, with_attrs):
+        query = (points[:, 0] * res_v + points[:, 1]) * res_v + points[:, 2]
+        idx = torch.searchsorted(keys, query).clamp(max=keys.shape[0] - 1)
+        found = keys[idx] == query
+        v = torch.where(found, values[idx], torch.full_like(values[idx], outside_value))
+        a = attrs[idx] * found.unsqueeze(-1).to(attrs.dtype) if with_attrs and attrs is not None else None
+        return v, a
+
+    inside = coords[values < 0]
+    if inside.shape[0] == 0:
+        return (
+            torch.zeros(0, 3, device=coords.device),
+            torch.zeros(0, 3, dtype=torch.long, device=coords.device),
+            None if attrs is None else attrs.new_zeros(0, attrs.shape[1]),
+        )
+    cubes = (inside.unsqueeze(1) - CORNER_OFFSETS.to(coords.device).unsqueeze(0)).reshape(-1, 3)
+    cubes = cubes[((cubes >= 0) & (cubes < res)).all(dim=1)]
+    cubes = torch.unique(cubes, dim=0)
+    return _march(cubes, fetch, res_v)
+
+
+
+def dense_marching_cubes(
+    values: torch.Tensor,
+    attrs: Optional[torch.Tensor] = None,
+) -> Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor]]:
+    """
+    Marching cubes over a dense grid, on the grid's device.
+
+    Args:
+        values: [R, R, R] grid values; negative is inside.
+        attrs: [R, R, R, F] optional per-vertex attributes to interpolate onto the surface.
+
+    Returns:
+        vertices: [V, 3] vertices in grid coordinates.
+        faces: [T, 3] triangle indices.
+        attrs: [V, F] interpolated attributes, or None.
+    """
+    res_v = values.shape[0]
+    inside = (values < 0).float()[None, None]
+    # A cube is crossed if it has both an inside and an outside corner.
+    any_inside = torch.nn.functional.max_pool3d(inside, kernel_size=2, stride=1)[0, 0] > 0
+    any_outside = torch.nn.functional.max_pool3d(1 - inside, kernel_size=2, stride=1)[0, 0] > 0
+    cubes = torch.nonzero(any_inside & any_outside)
+
+    def fetch(points, with_attrs):
+        v = values[points[:, 0], points[:, 1], points[:, 2]]
+        a = attrs[points[:, 0], points[:, 1], points[:, 2]] if with_attrs and attrs is not None else None
+        return v, a
+
+    return _march(cubes, fetch, res_v)
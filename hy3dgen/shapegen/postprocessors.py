@@ -14,7 +14,7 @@
 
 import os
 import tempfile
-from typing import Union
+from typing import Callable, List, Tuple, Union
 
 import numpy as np
 import pymeshlab
@@ -59,43 +59,52 @@ def remove_floater(mesh: pymeshlab.MeshSet):
     return mesh
 
 
-def pymeshlab2trimesh(mesh: pymeshlab.MeshSet):
-    with tempfile.NamedTemporaryFile(suffix='.ply', delete=False) as temp_file:
-        mesh.save_current_mesh(temp_file.name)
-        mesh = trimesh.load(temp_file.name)
-    # 检查加载的对象类型
+def _flatten_scene(mesh: Union[trimesh.Trimesh, trimesh.Scene]) -> trimesh.Trimesh:
     if isinstance(mesh, trimesh.Scene):
-        combined_mesh = trimesh.Trimesh()
-        # 如果是Scene，遍历所有的geometry并合并
-        for geom in mesh.geometry.values():
-            combined_mesh = trimesh.util.concatenate([combined_mesh, geom])
-        mesh = combined_mesh
+        # Merge all geometries of the scene into a single mesh
+        mesh = trimesh.util.concatenate(list(mesh.geometry.values()))
     return mesh
 
 
-def trimesh2pymeshlab(mesh: trimesh.Trimesh):
-    with tempfile.NamedTemporaryFile(suffix='.ply', delete=False) as temp_file:
-        if isinstance(mesh, trimesh.scene.Scene):
-            for idx, obj in enumerate(mesh.geometry.values()):
-                if idx == 0:
-                    temp_mesh = obj
-                else:
-                    temp_mesh = temp_mesh + obj
-            mesh = temp_mesh
-        mesh.export(temp_file.name)
-        mesh = pymeshlab.MeshSet()
-        mesh.load_new_mesh(temp_file.name)
+def _pymeshlab_matrices(mesh: pymeshlab.MeshSet):
+    current = mesh.current_mesh()
+    if not current.is_compact():
+        current.compact()
+    return current.vertex_matrix(), current.face_matrix()
+
+
+def _arrays2pymeshlab(vertices: np.ndarray, faces: np.ndarray, **attributes) -> pymeshlab.MeshSet:
+    mesh = pymeshlab.MeshSet()
+    mesh.add_mesh(pymeshlab.Mesh(
+        vertex_matrix=np.ascontiguousarray(vertices, dtype=np.float64),
+        face_matrix=np.ascontiguousarray(faces, dtype=np.int32),
+        **attributes
+    ), "converted_mesh")
     return mesh
 
 
+def pymeshlab2trimesh(mesh: pymeshlab.MeshSet):
+    vertices, faces = _pymeshlab_matrices(mesh)
+    vertex_colors = None
+    if mesh.current_mesh().has_vertex_color():
+        vertex_colors = np.rint(mesh.current_mesh().vertex_color_matrix() * 255).astype(np.uint8)
+    return trimesh.Trimesh(vertices=vertices, faces=faces, vertex_colors=vertex_colors)
+
+
+def trimesh2pymeshlab(mesh: Union[trimesh.Trimesh, trimesh.Scene]):
+    mesh = _flatten_scene(mesh)
+    attributes = {}
+    if mesh.visual.kind == 'vertex':
+        attributes['v_color_matrix'] = np.asarray(mesh.visual.vertex_colors, dtype=np.float64) / 255.0
+    return _arrays2pymeshlab(mesh.vertices, mesh.faces, **attributes)
+
+
 def export_mesh(input, output):
     if isinstance(input, pymeshlab.MeshSet):
         mesh = output
     elif isinstance(input, Latent2MeshOutput):
-        output = Latent2MeshOutput()
-        output.mesh_v = output.current_mesh().vertex_matrix()
-        output.mesh_f = output.current_mesh().face_matrix()
-        mesh = output
+        mesh = Latent2MeshOutput()
+        mesh.mesh_v, mesh.mesh_f = _pymeshlab_matrices(output)
     else:
         mesh = pymeshlab2trimesh(output)
     return mesh
@@ -105,9 +114,7 @@ def import_mesh(mesh: Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutpu
     if isinstance(mesh, str):
         mesh = load_mesh(mesh)
     elif isinstance(mesh, Latent2MeshOutput):
-        mesh = pymeshlab.MeshSet()
-        mesh_pymeshlab = pymeshlab.Mesh(vertex_matrix=mesh.mesh_v, face_matrix=mesh.mesh_f)
-        mesh.add_mesh(mesh_pymeshlab, "converted_mesh")
+        mesh = _arrays2pymeshlab(mesh.mesh_v, mesh.mesh_f)
 
     if isinstance(mesh, (trimesh.Trimesh, trimesh.scene.Scene)):
         mesh = trimesh2pymeshlab(mesh)
@@ -116,6 +123,9 @@ def import_mesh(mesh: Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutpu
 
 
 class FaceReducer:
+    def apply(self, ms: pymeshlab.MeshSet, max_facenum: int = 40000) -> pymeshlab.MeshSet:
+        return reduce_face(ms, max_facenum=max_facenum)
+
     @synchronize_timer('FaceReducer')
     def __call__(
         self,
@@ -123,40 +133,93 @@ class FaceReducer:
         max_facenum: int = 40000
     ) -> Union[pymeshlab.MeshSet, trimesh.Trimesh]:
         ms = import_mesh(mesh)
-        ms = reduce_face(ms, max_facenum=max_facenum)
+        ms = self.apply(ms, max_facenum=max_facenum)
         mesh = export_mesh(mesh, ms)
         return mesh
 
 
 class FloaterRemover:
+    def apply(self, ms: pymeshlab.MeshSet) -> pymeshlab.MeshSet:
+        return remove_floater(ms)
+
     @synchronize_timer('FloaterRemover')
     def __call__(
         self,
         mesh: Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput, str],
     ) -> Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput]:
         ms = import_mesh(mesh)
-        ms = remove_floater(ms)
+        ms = self.apply(ms)
         mesh = export_mesh(mesh, ms)
         return mesh
 
 
 class DegenerateFaceRemover:
+    def apply(self, ms: pymeshlab.MeshSet) -> pymeshlab.MeshSet:
+        # Rebuild from the compacted matrices, dropping deleted elements
+        vertices, faces = _pymeshlab_matrices(ms)
+        attributes = {}
+        if ms.current_mesh().has_vertex_color():
+            attributes['v_color_matrix'] = ms.current_mesh().vertex_color_matrix()
+        return _arrays2pymeshlab(vertices, faces, **attributes)
+
     @synchronize_timer('DegenerateFaceRemover')
     def __call__(
         self,
         mesh: Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput, str],
     ) -> Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput]:
         ms = import_mesh(mesh)
-
-        with tempfile.NamedTemporaryFile(suffix='.ply', delete=False) as temp_file:
-            ms.save_current_mesh(temp_file.name)
-            ms = pymeshlab.MeshSet()
-            ms.load_new_mesh(temp_file.name)
-
+        ms = self.apply(ms)
         mesh = export_mesh(mesh, ms)
         return mesh
 
 
+class PostprocessPipeline:
+    """
+    Chain postprocessors with a single conversion into pymeshlab and back.
+
+    Every op is a postprocessor with an `apply(ms, **kwargs)` method (FloaterRemover,
+    DegenerateFaceRemover, FaceReducer, ...) or a function taking and returning a
+    pymeshlab.MeshSet, optionally paired with its keyword arguments:
+
+    ```python
+    pipeline = PostprocessPipeline([
+        FloaterRemover(),
+        DegenerateFaceRemover(),
+        (FaceReducer(), dict(max_facenum=40000)),
+    ])
+    mesh = pipeline(mesh)
+    ```
+
+    With HY3DGEN_DEBUG=1, the time of every op (and of the conversions) of the last
+    call is kept in `timings` as (name, ms) pairs.
+    """
+
+    def __init__(self, ops: List[Union[Callable, Tuple[Callable, dict]]]):
+        self.ops = [op if isinstance(op, tuple) else (op, {}) for op in ops]
+        self.timings = []
+
+    @synchronize_timer('PostprocessPipeline')
+    def __call__(
+        self,
+        mesh: Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput, str],
+    ) -> Union[pymeshlab.MeshSet, trimesh.Trimesh, Latent2MeshOutput]:
+        self.timings = []
+        ms = self._timed('import_mesh', import_mesh, mesh)
+        for op, kwargs in self.ops:
+            if hasattr(op, 'apply'):
+                ms = self._timed(type(op).__name__, op.apply, ms, **kwargs)
+            else:
+                ms = self._timed(getattr(op, '__name__', type(op).__name__), op, ms, **kwargs)
+        return self._timed('export_mesh', export_mesh, mesh, ms)
+
+    def _timed(self, name, func, *args, **kwargs):
+        with synchronize_timer(name) as elapsed:
+            result = func(*args, **kwargs)
+        if elapsed is not None:
+            self.timings.append((name, elapsed()))
+        return result
+
+
 def mesh_normalize(mesh):
     """
     Normalize mesh vertices to sphere
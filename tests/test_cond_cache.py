@@ -0,0 +1,16 @@
+import torch
+
+from hi3dgen.pipelines.cond_cache import ConditioningCache
+
+
+def test_put_stores_own_storage():
+    cache = ConditioningCache()
+    batch = torch.randn(8, 1374, 1024)
+    for i, tokens in enumerate(batch):
+        cache.put(str(i), tokens)
+
+    entry = cache.get('0', batch.device)
+    assert torch.equal(entry, batch[0])
+    assert entry.untyped_storage().data_ptr() != batch.untyped_storage().data_ptr()
+    assert entry.untyped_storage().nbytes() == entry.numel() * entry.element_size()
+    assert cache.stats()['device_bytes'] == batch.numel() * batch.element_size()
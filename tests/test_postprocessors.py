@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+pymeshlab = pytest.importorskip("pymeshlab")
+trimesh = pytest.importorskip("trimesh")
+
+from hy3dgen.shapegen.postprocessors import DegenerateFaceRemover, trimesh2pymeshlab
+
+
+def _colored_mesh():
+    mesh = trimesh.creation.icosphere(subdivisions=2)
+    colors = np.zeros((len(mesh.vertices), 4), dtype=np.uint8)
+    colors[:, 0] = np.arange(len(mesh.vertices)) % 256
+    colors[:, 1] = 200
+    colors[:, 3] = 255
+    mesh.visual.vertex_colors = colors
+    return mesh
+
+
+def test_degenerate_face_remover_keeps_vertex_colors():
+    mesh = _colored_mesh()
+    ms = DegenerateFaceRemover().apply(trimesh2pymeshlab(mesh))
+    assert ms.current_mesh().has_vertex_color()
+
+    result = DegenerateFaceRemover()(mesh)
+    np.testing.assert_allclose(result.vertices, mesh.vertices)
+    np.testing.assert_array_equal(result.visual.vertex_colors, mesh.visual.vertex_colors)
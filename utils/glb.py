@@ -0,0 +1,362 @@
+"""
+Compact GLB export for meshes.
+
+Levels (see export_glb):
+- "none": float32 positions/normals and uint32 indices.
+- "quantize": KHR_mesh_quantization (int16 positions, int8 normals) and
+  16-bit indices when the vertex count allows.
+- "meshopt": "quantize" plus EXT_meshopt_compression; the vertex and index
+  codecs below are NumPy ports of meshoptimizer's encoders and produce
+  streams its decoder (three.js, Babylon, gltfpack, ...) reads as is.
+"""
+
+import json
+import struct
+import numpy as np
+
+
+COMPRESSION_LEVELS = ("none", "quantize", "meshopt")
+
+_GLB_MAGIC = 0x46546C67
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+
+_BYTE, _SHORT, _UNSIGNED_SHORT, _UNSIGNED_INT, _FLOAT = 5120, 5122, 5123, 5125, 5126
+_ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+# meshoptimizer codec constants
+_VERTEX_HEADER = 0xA0          # vertex codec, version 0
+_SEQUENCE_HEADER = 0xD1        # index sequence codec, version 1
+_BYTE_GROUP_SIZE = 16
+_VERTEX_BLOCK_SIZE_BYTES = 8192
+_VERTEX_BLOCK_MAX_SIZE = 256
+_TAIL_MAX_SIZE = 32
+
+
+def export_glb(vertices, faces, normals, compression="none"):
+    """
+    Export a triangle mesh as GLB.
+
+    Args:
+        vertices: [V, 3] vertex positions
+        faces: [F, 3] triangle indices
+        normals: [V, 3] unit vertex normals
+        compression: One of COMPRESSION_LEVELS
+
+    Returns:
+        bytes: GLB file contents
+    """
+    if compression not in COMPRESSION_LEVELS:
+        raise ValueError(f"Unknown GLB compression '{compression}', expected one of {COMPRESSION_LEVELS}")
+    vertices = np.asarray(vertices, dtype=np.float64)
+    normals = np.asarray(normals, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    node = {"mesh": 0}
+
+    if compression == "none":
+        positions = vertices.astype(np.float32)
+        streams = [
+            # (data, byteStride, target, accessor fields)
+            (positions, 12, _ARRAY_BUFFER, {
+                "componentType": _FLOAT,
+                "type": "VEC3",
+                **_bounds(positions),
+            }),
+            (normals.astype(np.float32), 12, _ARRAY_BUFFER, {"componentType": _FLOAT, "type": "VEC3"}),
+            (faces.reshape(-1).astype(np.uint32), None, _ELEMENT_ARRAY_BUFFER, {
+                "componentType": _UNSIGNED_INT,
+                "type": "SCALAR",
+            }),
+        ]
+        return _write_glb(streams, node, compression)
+
+    # Vertices in order of first use: local deltas for both codecs
+    _, first_use = np.unique(faces.reshape(-1), return_index=True)
+    order = faces.reshape(-1)[np.sort(first_use)]
+    remap = np.empty(len(vertices), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    vertices, normals, faces = vertices[order], normals[order], remap[faces]
+
+    positions, translation, scale = _quantize_positions(vertices)
+    node.update({"translation": translation, "scale": [scale] * 3})
+    # The largest value of an index type is reserved for primitive restart
+    index_type = np.uint16 if len(vertices) < 0xFFFF else np.uint32
+    streams = [
+        (positions, 8, _ARRAY_BUFFER, {
+            "componentType": _SHORT,
+            "type": "VEC3",
+            **_bounds(positions[:, :3]),
+        }),
+        (_quantize_normals(normals), 4, _ARRAY_BUFFER, {
+            "componentType": _BYTE,
+            "normalized": True,
+            "type": "VEC3",
+        }),
+        (faces.reshape(-1).astype(index_type), None, _ELEMENT_ARRAY_BUFFER, {
+            "componentType": _UNSIGNED_SHORT if index_type is np.uint16 else _UNSIGNED_INT,
+            "type": "SCALAR",
+        }),
+    ]
+    return _write_glb(streams, node, compression)
+
+
+def _bounds(positions):
+    """Accessor min/max, required for POSITION."""
+    if len(positions) == 0:
+        return {"min": [0, 0, 0], "max": [0, 0, 0]}
+    return {"min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist()}
+
+
+def _write_glb(streams, node, compression):
+    """
+    Lay out (data, byteStride, target, accessor) streams as POSITION, NORMAL and
+    indices of a single primitive, meshopt compressed if asked for.
+    """
+    extensions = []
+    if compression != "none":
+        extensions.append("KHR_mesh_quantization")
+    if compression == "meshopt":
+        extensions.append("EXT_meshopt_compression")
+    gltf = {
+        "asset": {"version": "2.0", "generator": "hi3dgen-worker"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{"primitives": [{
+            "attributes": {"POSITION": 0, "NORMAL": 1},
+            "indices": 2,
+            "mode": 4,
+        }]}],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+    }
+    if extensions:
+        gltf["extensionsUsed"] = gltf["extensionsRequired"] = extensions
+
+    binary = bytearray()
+    fallback_length = 0
+    for i, (data, stride, target, accessor) in enumerate(streams):
+        raw = np.ascontiguousarray(data).tobytes()
+        view = {"buffer": 0, "byteOffset": len(binary), "byteLength": len(raw), "target": target}
+        if stride is not None:
+            view["byteStride"] = stride
+        if compression == "meshopt":
+            if stride is not None:
+                encoded = encode_vertex_buffer(data.view(np.uint8).reshape(len(data), stride))
+                meshopt = {"mode": "ATTRIBUTES", "byteStride": stride, "count": len(data)}
+            else:
+                encoded = encode_index_sequence(data)
+                meshopt = {"mode": "INDICES", "byteStride": data.itemsize, "count": len(data)}
+            meshopt.update({"buffer": 0, "byteOffset": len(binary), "byteLength": len(encoded)})
+            # The uncompressed view lives in a data-less fallback buffer
+            view.update({"buffer": 1, "byteOffset": fallback_length, "extensions": {"EXT_meshopt_compression": meshopt}})
+            fallback_length += _pad4(len(raw))
+            raw = encoded
+        binary += raw + b"\x00" * (_pad4(len(raw)) - len(raw))
+        gltf["bufferViews"].append(view)
+        gltf["accessors"].append({"bufferView": i, "count": len(data), **accessor})
+
+    gltf["buffers"].append({"byteLength": len(binary)})
+    if compression == "meshopt":
+        gltf["buffers"].append({
+            "byteLength": fallback_length,
+            "extensions": {"EXT_meshopt_compression": {"fallback": True}},
+        })
+    return _pack_glb(gltf, bytes(binary))
+
+
+def _pad4(n):
+    return (n + 3) & ~3
+
+
+def _pack_glb(gltf, binary):
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (_pad4(len(json_bytes)) - len(json_bytes))
+    total = 12 + 8 + len(json_bytes) + 8 + len(binary)
+    return b"".join([
+        struct.pack("<III", _GLB_MAGIC, 2, total),
+        struct.pack("<II", len(json_bytes), _CHUNK_JSON), json_bytes,
+        struct.pack("<II", len(binary), _CHUNK_BIN), binary,
+    ])
+
+
+def _quantize_positions(vertices):
+    """
+    int16 positions in a uniform grid around the bounding box center, padded to
+    4 components (8 bytes per vertex). Returns them with the node translation
+    and scale that map them back.
+    """
+    if len(vertices) == 0:
+        return np.zeros((0, 4), dtype=np.int16), [0.0, 0.0, 0.0], 1.0
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    center = (lo + hi) / 2
+    half_extent = float((hi - lo).max()) / 2 or 1.0
+    scale = half_extent / 32767
+    quantized = np.zeros((len(vertices), 4), dtype=np.int16)
+    quantized[:, :3] = np.clip(np.rint((vertices - center) / scale), -32767, 32767)
+    return quantized, center.tolist(), scale
+
+
+def _quantize_normals(normals):
+    """Normalized int8 normals padded to 4 components (4 bytes per vertex)."""
+    quantized = np.zeros((len(normals), 4), dtype=np.int8)
+    quantized[:, :3] = np.clip(np.rint(normals * 127), -127, 127)
+    return quantized
+
+
+# -----------------------------------------------------------------------------
+# meshoptimizer codecs
+# -----------------------------------------------------------------------------
+
+def _flatten_rows(rows, lengths):
+    """Concatenate the first lengths[i] bytes of every row of a 2D uint8 array."""
+    mask = np.arange(rows.shape[1]) < lengths[:, None]
+    return rows[mask]
+
+
+def _encode_byte_groups(groups):
+    """
+    Encode [G, 16] uint8 byte groups with the smallest of meshoptimizer's group
+    encodings (0: all zero, 1: 2 bits, 2: 4 bits, 3: raw bytes).
+
+    Returns:
+        rows: [G, 24] encoded groups, padded
+        lengths: [G] encoded size of every group
+        bitslog2: [G] selected encoding
+    """
+    count = groups.shape[0]
+    best_size = np.full(count, 16)
+    bitslog2 = np.full(count, 3)
+    for log2, bits in ((2, 4), (1, 2)):
+        sentinel = (1 << bits) - 1
+        size = 2 * bits + (groups >= sentinel).sum(axis=1)
+        better = size < best_size
+        best_size[better], bitslog2[better] = size[better], log2
+    zero = ~groups.any(axis=1)
+    best_size[zero], bitslog2[zero] = 0, 0
+
+    rows = np.zeros((count, 24), dtype=np.uint8)
+    rows[bitslog2 == 3, :16] = groups[bitslog2 == 3]
+    for log2, bits in ((1, 2), (2, 4)):
+        select = bitslog2 == log2
+        if not select.any():
+            continue
+        values = groups[select]
+        sentinel = (1 << bits) - 1
+        per_byte = 8 // bits
+        fixed_size = 16 // per_byte
+        # Fixed part: one bit field per value, first value in the high bits
+        fields = np.minimum(values, sentinel).astype(np.uint32).reshape(-1, fixed_size, per_byte)
+        shifts = bits * np.arange(per_byte - 1, -1, -1, dtype=np.uint32)
+        fixed = (fields << shifts).sum(axis=2).astype(np.uint8)
+        # Variable part: full bytes of the out-of-range values, in order
+        escaped = values >= sentinel
+        compact = np.argsort(~escaped, axis=1, kind="stable")
+        extra = np.take_along_axis(values, compact, axis=1)
+        extra[np.arange(16) >= escaped.sum(axis=1, keepdims=True)] = 0
+        rows[select, :fixed_size] = fixed
+        rows[select, fixed_size:fixed_size + 16] = extra
+    return rows, best_size, bitslog2
+
+
+def _encode_bytes(channels):
+    """
+    meshoptimizer's encodeBytes over many equally sized byte streams at once.
+
+    Args:
+        channels: [C, N] uint8 with N a multiple of 16
+
+    Returns:
+        rows, lengths: padded encoded rows whose concatenation is the encoding of
+            channel 0, then channel 1, ...
+    """
+    num_channels, size = channels.shape
+    num_groups = size // _BYTE_GROUP_SIZE
+    header_size = (num_groups + 3) // 4
+    rows, lengths, bitslog2 = _encode_byte_groups(channels.reshape(-1, _BYTE_GROUP_SIZE))
+
+    # Header: 2 bits per group, 4 groups per byte, first group in the low bits
+    codes = np.zeros((num_channels, header_size * 4), dtype=np.uint8)
+    codes[:, :num_groups] = bitslog2.reshape(num_channels, num_groups)
+    header = (codes.reshape(num_channels, header_size, 4) << np.array([0, 2, 4, 6], dtype=np.uint8)).sum(axis=2)
+    header_rows = np.zeros((num_channels, 1, rows.shape[1]), dtype=np.uint8)
+    header_rows[:, 0, :header_size] = header
+
+    rows = np.concatenate([header_rows, rows.reshape(num_channels, num_groups, -1)], axis=1)
+    lengths = np.concatenate([
+        np.full((num_channels, 1), header_size),
+        lengths.reshape(num_channels, num_groups),
+    ], axis=1)
+    return rows.reshape(-1, rows.shape[2]), lengths.reshape(-1)
+
+
+def encode_vertex_buffer(vertex_bytes):
+    """
+    Encode a vertex buffer with meshoptimizer's vertex codec (version 0), as
+    used by EXT_meshopt_compression in ATTRIBUTES mode.
+
+    Args:
+        vertex_bytes: [N, stride] uint8, stride a multiple of 4 and at most 256
+
+    Returns:
+        bytes: Encoded stream
+    """
+    count, stride = vertex_bytes.shape
+    assert stride % 4 == 0 and 0 < stride <= 256, f"Invalid vertex stride {stride}"
+    # Byte-wise deltas to the previous vertex (the first vertex is its own baseline)
+    previous = np.concatenate([vertex_bytes[:1], vertex_bytes[:-1]])
+    deltas = (vertex_bytes - previous).astype(np.uint8)
+    zigzag = ((deltas << 1) ^ (deltas.view(np.int8) >> 7).view(np.uint8)).astype(np.uint8)
+
+    block_size = min((_VERTEX_BLOCK_SIZE_BYTES // stride) & ~(_BYTE_GROUP_SIZE - 1), _VERTEX_BLOCK_MAX_SIZE)
+    chunks = [bytes([_VERTEX_HEADER])]
+    full_blocks = count // block_size
+    if full_blocks:
+        # [blocks * stride, block_size]: one byte stream per block and channel
+        blocks = zigzag[:full_blocks * block_size].reshape(full_blocks, block_size, stride)
+        rows, lengths = _encode_bytes(blocks.transpose(0, 2, 1).reshape(-1, block_size))
+        chunks.append(_flatten_rows(rows, lengths).tobytes())
+    tail = count - full_blocks * block_size
+    if tail:
+        aligned = (tail + _BYTE_GROUP_SIZE - 1) & ~(_BYTE_GROUP_SIZE - 1)
+        channels = np.zeros((stride, aligned), dtype=np.uint8)
+        channels[:, :tail] = zigzag[full_blocks * block_size:].T
+        rows, lengths = _encode_bytes(channels)
+        chunks.append(_flatten_rows(rows, lengths).tobytes())
+
+    # The first vertex closes the stream, padded to 32 bytes
+    first = vertex_bytes[0].tobytes() if count else bytes(stride)
+    chunks.append(bytes(max(_TAIL_MAX_SIZE - stride, 0)) + first)
+    return b"".join(chunks)
+
+
+def encode_index_sequence(indices):
+    """
+    Encode an index buffer with meshoptimizer's index sequence codec (version
+    1), as used by EXT_meshopt_compression in INDICES mode.
+
+    Every index is stored as the zigzag delta to the previous one. The decoder
+    also supports switching between two baselines; the single baseline keeps the
+    encoder vectorized at a small cost in size.
+
+    Args:
+        indices: [N] unsigned integer indices
+
+    Returns:
+        bytes: Encoded stream
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    deltas = np.diff(indices, prepend=0)
+    assert np.abs(deltas).max(initial=0) < 1 << 30, "Index deltas too large for the sequence codec"
+    zigzag = np.where(deltas < 0, -2 * deltas - 1, 2 * deltas)
+    # Low bit selects the baseline (always 0)
+    values = (zigzag << 1).astype(np.uint64)
+
+    # 7-bit little-endian varints, high bit marks continuation
+    groups = (values[:, None] >> (7 * np.arange(5, dtype=np.uint64))) & 0x7F
+    nonzero = groups != 0
+    lengths = np.where(nonzero.any(axis=1), 5 - nonzero[:, ::-1].argmax(axis=1), 1)
+    rows = groups.astype(np.uint8)
+    rows[np.arange(5) < (lengths[:, None] - 1)] |= 0x80
+    return bytes([_SEQUENCE_HEADER]) + _flatten_rows(rows, lengths).tobytes() + bytes(4)
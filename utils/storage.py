@@ -43,15 +43,34 @@ def upload_job(job_id, local_dir):
     return generate_signed_url(f"jobs/{job_id}/meta.json")
 
 
-def generate_signed_url(key):
+def upload_fileobj(key, fileobj, content_type=None, expires_in=3600):
+    """
+    Stream a file-like object to S3 (multipart for large objects, no temp file).
+    
+    Args:
+        key: S3 object key
+        fileobj: Readable binary file-like object, e.g. io.BytesIO
+        content_type: Optional Content-Type stored with the object
+        expires_in: Lifetime of the returned URL in seconds
+        
+    Returns:
+        str: Presigned URL to the uploaded object
+    """
+    extra_args = {"ContentType": content_type} if content_type else None
+    s3.upload_fileobj(fileobj, BUCKET, key, ExtraArgs=extra_args)
+    return generate_signed_url(key, expires_in=expires_in)
+
+
+def generate_signed_url(key, expires_in=3600):
     """
     Generate presigned URL for S3 object.
     
     Args:
         key: S3 object key
+        expires_in: Lifetime of the URL in seconds (default 1 hour)
         
     Returns:
-        str: Presigned URL (valid for 1 hour)
+        str: Presigned URL
     """
     return s3.generate_presigned_url(
         "get_object",
@@ -59,6 +78,6 @@ def generate_signed_url(key):
             "Bucket": BUCKET,
             "Key": key
         },
-        ExpiresIn=3600
+        ExpiresIn=expires_in
     )
 